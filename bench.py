@@ -0,0 +1,440 @@
+import os
+import sys
+import copy
+import json
+import time
+import random
+import asyncio
+import argparse
+import tempfile
+import tracemalloc
+from aiohttp import web
+
+# steam.py는 불러올 때 현재 폴더의 config.json을 읽으므로 임시 폴더에 벤치마크용 설정을 만들어 둠
+BENCH_DIR = tempfile.mkdtemp(prefix='steam-bench-')
+
+with open(os.path.join(BENCH_DIR, 'config.json'), 'w') as f:
+    f.write(json.dumps({'bot_token': '',
+                        'owner_user_id': '0',
+                        'test_mode': True,
+                        'interval': 60,
+                        'metrics_port': 0,
+                        'database': os.path.join(BENCH_DIR, 'bench.db')}, indent=4))
+
+SOURCE_DIR = os.path.dirname(os.path.abspath(__file__))
+FIXTURES_DIR = os.path.join(SOURCE_DIR, 'fixtures')
+
+sys.path.insert(0, SOURCE_DIR)
+os.chdir(BENCH_DIR)
+
+import steam  # noqa: E402
+
+PACKAGE_OFFSET = 1000000
+BUNDLE_OFFSET = 2000000
+
+
+def sample_price(i):
+    initial = 2200000 + i % 40 * 100000
+    discount_perc = (0, 10, 25, 50, 75)[i % 5]
+    final = initial * (100 - discount_perc) // 100
+
+    # json.loads가 만드는 것처럼 매번 새 문자열 객체를 만듦
+    return (''.join(['Product ', str(i)]),
+            initial, ''.join(['₩ ', format(initial // 100, ',d')]),
+            final, ''.join(['₩ ', format(final // 100, ',d')]),
+            bool(discount_perc), discount_perc)
+
+
+def percentile(samples, p):
+    if not samples:
+        return 0.0
+
+    samples = sorted(samples)
+    return samples[min(len(samples) - 1, int(len(samples) * p / 100))]
+
+
+def latency_summary(samples):
+    return ' '.join(f'p{p}={percentile(samples, p) * 1000:.1f}ms' for p in (50, 95, 99))
+
+
+class StandInStore:
+    # 스팀 상점 API 대신 응답하는 로컬 서버 (지연, 오류, 429 응답을 설정할 수 있음)
+    def __init__(self, args):
+        self.latency = args.latency / 1000
+        self.error_rate = args.error_rate
+        self.throttle_rate = args.throttle_rate
+        self.page_size = args.page_size
+        self.random = random.Random(0)
+        self.statuses = {}
+        self.runner = None
+        self.url = None
+        self.fixtures = {}
+
+        # 기록해 둔 스팀 응답이 있으면 그 형태 그대로 응답하고, json은 상품 번호와 가격만 바꿔서 돌려줌
+        if not args.synthetic:
+            for name in ('appdetails.json', 'packagedetails.json', 'ajaxresolvebundles.json', 'bundle.html', 'search.html'):
+                path = os.path.join(args.fixtures, name)
+
+                if not os.path.isfile(path):
+                    continue
+
+                with open(path, 'rb') as f:
+                    content = f.read()
+
+                if name.endswith('.json'):
+                    content = json.loads(content)
+                    content = content[0] if isinstance(content, list) else next(iter(content.values()))
+
+                self.fixtures[name] = content
+
+    @staticmethod
+    def price(product_id):
+        _, initial, initial_formatted, final, final_formatted, on_sale, discount_perc = sample_price(product_id)
+        return initial, initial_formatted, final, final_formatted, discount_perc
+
+    def count(self, status):
+        self.statuses[status] = self.statuses.get(status, 0) + 1
+
+    @web.middleware
+    async def faults(self, request, handler):
+        if self.latency:
+            await asyncio.sleep(self.latency)
+
+        roll = self.random.random()
+
+        if roll < self.throttle_rate:
+            self.count(429)
+            return web.Response(status=429, headers={'Retry-After': '1'})
+
+        if roll < self.throttle_rate + self.error_rate:
+            self.count(500)
+            return web.Response(status=500)
+
+        self.count(200)
+        return await handler(request)
+
+    async def appdetails(self, request):
+        ids = request.query['appids'].split(',')
+        price_only = request.query.get('filters') == 'price_overview'
+
+        if len(ids) > 1 and not price_only:  # 스팀도 여러 앱은 price_overview 필터로만 조회할 수 있음
+            return web.json_response(None)
+
+        data = {}
+
+        for app_id in ids:
+            initial, initial_formatted, final, final_formatted, discount_perc = self.price(int(app_id))
+            overview = {'currency': 'KRW',
+                        'initial': initial,
+                        'final': final,
+                        'discount_percent': discount_perc,
+                        'initial_formatted': initial_formatted if discount_perc else '',
+                        'final_formatted': final_formatted}
+
+            if price_only:
+                data[app_id] = {'success': True, 'data': {'price_overview': overview}}
+            elif 'appdetails.json' in self.fixtures:
+                data[app_id] = copy.deepcopy(self.fixtures['appdetails.json'])
+                data[app_id]['data'].update(steam_appid=int(app_id), price_overview=overview)
+            else:
+                data[app_id] = {'success': True, 'data': {'type': 'game', 'name': f'Stand-in App {app_id}', 'steam_appid': int(app_id), 'price_overview': overview}}
+
+        return web.json_response(data)
+
+    async def packagedetails(self, request):
+        data = {}
+
+        for package_id in request.query['packageids'].split(','):
+            initial, _, final, _, discount_perc = self.price(int(package_id))
+            price = {'currency': 'KRW', 'initial': initial, 'final': final, 'discount_percent': discount_perc}
+
+            if 'packagedetails.json' in self.fixtures:
+                data[package_id] = copy.deepcopy(self.fixtures['packagedetails.json'])
+                data[package_id]['data']['price'].update(price, individual=initial)
+            else:
+                data[package_id] = {'success': True, 'data': {'name': f'Stand-in Package {package_id}', 'price': price}}
+
+        return web.json_response(data)
+
+    async def resolve_bundles(self, request):
+        bundles = []
+
+        for bundle_id in request.query['bundleids'].split(','):
+            _, initial_formatted, final, final_formatted, discount_perc = self.price(int(bundle_id))
+            bundle = copy.deepcopy(self.fixtures.get('ajaxresolvebundles.json', {'name': f'Stand-in Bundle {bundle_id}'}))
+            bundle.update(bundleid=int(bundle_id),
+                          final_price=final,
+                          formatted_orig_price=initial_formatted,
+                          formatted_final_price=final_formatted,
+                          discount_percent=discount_perc)
+            bundles.append(bundle)
+
+        return web.json_response(bundles)
+
+    async def bundle_page(self, request):
+        if 'bundle.html' in self.fixtures:
+            return web.Response(body=self.fixtures['bundle.html'], content_type='text/html')
+
+        bundle_id = request.match_info['bundle_id']
+        _, initial_formatted, _, final_formatted, discount_perc = self.price(int(bundle_id))
+        page = (f'<html><body><div class="page_title_area"><h2 class="pageheader">Stand-in Bundle {bundle_id}</h2></div>'
+                f'<div class="discount_block game_purchase_discount"><div class="discount_pct">-{discount_perc}%</div>'
+                f'<div class="discount_prices"><div class="discount_original_price">{initial_formatted}</div>'
+                f'<div class="discount_final_price">{final_formatted}</div></div></div>')
+
+        # 실제 상점 페이지 크기만큼 나머지 마크업을 채움
+        filler = '<div class="game_area_description"><p>Lorem ipsum dolor sit amet</p></div>'
+        page += filler * max(0, (self.page_size - len(page)) // len(filler)) + '</body></html>'
+
+        return web.Response(text=page, content_type='text/html')
+
+    async def search_page(self, request):
+        if 'search.html' in self.fixtures:
+            return web.Response(body=self.fixtures['search.html'], content_type='text/html')
+
+        rows = []
+
+        for app_id in range(1, 51):
+            _, _, _, final_formatted, _ = self.price(app_id)
+            rows.append(f'<a href="https://store.steampowered.com/app/{app_id}/" class="search_result_row">'
+                        f'<div class="responsive_search_name_combined"><div class="col search_name ellipsis"><span class="title">'
+                        f'{request.query.get("term", "")} {app_id}</span></div>'
+                        f'<div class="col search_price responsive_secondrow">{final_formatted}</div></div></a>')
+
+        page = f'<html><body><div id="search_resultsRows">{"".join(rows)}</div></body></html>'
+        return web.Response(text=page, content_type='text/html')
+
+    async def featured(self, request):
+        return web.json_response({'specials': {'items': []}})
+
+    async def ok(self, request):
+        return web.Response(text='')
+
+    async def start(self):
+        app = web.Application(middlewares=[self.faults])
+        app.router.add_get('/api/appdetails', self.appdetails)
+        app.router.add_get('/api/packagedetails', self.packagedetails)
+        app.router.add_get('/api/featuredcategories', self.featured)
+        app.router.add_get('/actions/ajaxresolvebundles', self.resolve_bundles)
+        app.router.add_get('/bundle/{bundle_id}', self.bundle_page)
+        app.router.add_post('/agecheckset/bundle/{bundle_id}/', self.ok)
+        app.router.add_get('/search/', self.search_page)
+
+        self.runner = web.AppRunner(app)
+        await self.runner.setup()
+        site = web.TCPSite(self.runner, '127.0.0.1', 0)
+        await site.start()
+
+        host, port = self.runner.addresses[0][:2]
+        self.url = f'http://{host}:{port}'
+
+    async def stop(self):
+        await self.runner.cleanup()
+
+
+def record_latency(scheduler, samples):
+    request = scheduler.request
+
+    async def timed(method, url, **kwargs):
+        start = time.perf_counter()
+
+        try:
+            return await request(method, url, **kwargs)
+        finally:
+            samples.append(time.perf_counter() - start)
+
+    scheduler.request = timed
+
+
+def fill_watchlist(bot, size, warm):
+    bot.id_dict.clear()
+    bot.item_dict.clear()
+    bot.fetched_at.clear()
+
+    # 앱 80%, 패키지 15%, 묶음 상품 5%
+    for i in range(1, size + 1):
+        if i % 20 == 0:
+            product_id, url_type = str(BUNDLE_OFFSET + i), 'bundle'
+        elif i % 20 < 4:
+            product_id, url_type = str(PACKAGE_OFFSET + i), 'sub'
+        else:
+            product_id, url_type = str(i), 'app'
+
+        key = steam.product_key(product_id, steam.DEFAULT_REGION)
+        bot.id_dict[key] = {'type': url_type, 'id': product_id, 'cc': steam.DEFAULT_REGION}
+        bot.item_dict[key] = steam.PriceRecord(f'Product {key}', 0, '', 0, '', False, 0) if warm else None
+
+
+async def bench_cycle(bot, store, args):
+    print('items      requests  seconds  items/s    request latency                      peak MB  statuses')
+
+    for size in args.sizes:
+        fill_watchlist(bot, size, not args.cold)
+        samples = []
+        store.statuses = {}
+        record_latency(bot.scheduler, samples)
+
+        tracemalloc.start()
+        start = time.perf_counter()
+        await bot.update_dict()
+        elapsed = time.perf_counter() - start
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+
+        del bot.scheduler.request
+        bot.price_changes.clear()
+        bot.dirty_prices.clear()
+        bot.checked_prices.clear()
+        print(f'{size:<10} {len(samples):<9} {elapsed:<8.2f} {size / elapsed:<10.0f} {latency_summary(samples):<36} {peak / 2 ** 20:<8.1f} {store.statuses}')
+
+
+async def bench_bundle(bot, store, args):
+    samples = []
+
+    async def fetch(bundle_id):
+        start = time.perf_counter()
+        await bot.fetch_bundle(steam.product_key(bundle_id, steam.DEFAULT_REGION))
+        samples.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    await asyncio.gather(*[fetch(BUNDLE_OFFSET + i) for i in range(args.count)], return_exceptions=True)
+    elapsed = time.perf_counter() - start
+
+    print(f'fetch_bundle: {args.count} pages in {elapsed:.2f}s ({args.count / elapsed:.0f}/s) {latency_summary(samples)}')
+
+
+async def bench_search(bot, store, args):
+    samples = []
+
+    async def scrape(i):
+        start = time.perf_counter()
+        r = await bot.scheduler.get(f'{steam.STORE_URL}/search/?term=query{i}')
+        await bot.parse(steam.parse_search_page, r.body)
+        samples.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    await asyncio.gather(*[scrape(i) for i in range(args.count)], return_exceptions=True)
+    elapsed = time.perf_counter() - start
+    print(f'search page: {args.count} queries in {elapsed:.2f}s ({args.count / elapsed:.0f}/s) {latency_summary(samples)}')
+
+    names = {appid: f'Stand-in Game {appid} {random.choice(["Remastered", "Deluxe", "HD", ""])}' for appid in range(1, args.catalog_size + 1)}
+    start = time.perf_counter()
+    bot.catalog.replace(names, steam.build_catalog_index(names))
+    print(f'catalog: indexed {len(names)} names in {time.perf_counter() - start:.2f}s')
+
+    samples = []
+
+    for i in range(args.count):
+        start = time.perf_counter()
+        bot.catalog.search(f'game {i} deluxe')
+        samples.append(time.perf_counter() - start)
+
+    print(f'catalog search: {args.count} queries {latency_summary(samples)}')
+
+
+def bench_memory(args):
+    def legacy_item(i):
+        name, initial, initial_formatted, final, final_formatted, on_sale, discount_perc = sample_price(i)
+
+        return {'name': name,
+                'initial': str(initial)[:-2],
+                'initial_formatted': initial_formatted,
+                'final': str(final)[:-2],
+                'final_formatted': final_formatted,
+                'on_sale': on_sale,
+                'discount_perc': discount_perc}
+
+    def record_item(i):
+        return steam.PriceRecord(*sample_price(i))
+
+    def measure(factory, n):
+        tracemalloc.start()
+        items = {str(i): factory(i) for i in range(n)}
+        size = tracemalloc.get_traced_memory()[0]
+        tracemalloc.stop()
+
+        del items
+        return size
+
+    # 처음 만들 때는 sys.intern 테이블이 커지는 비용도 레코드에 함께 잡히므로 (first build),
+    # 실행 중인 봇처럼 테이블이 이미 커진 뒤의 크기는 여러 번 만들어 본 값의 중앙값으로 비교함
+    print('items      dict B/item  PriceRecord B/item  reduction  first build B/item')
+
+    for n in args.sizes:
+        legacy = measure(legacy_item, n)
+        first = measure(record_item, n)
+        compact = sorted(measure(record_item, n) for _ in range(3))[1]
+        reduction = f'{100 - compact * 100 / legacy:.0f}%'
+        print(f'{n:<10} {legacy / n:<12.0f} {compact / n:<19.0f} {reduction:<10} {first / n:.0f}')
+
+
+def run_online(bench, args):
+    steam.REQUESTS_PER_SECOND = args.rps
+    steam.MAX_CONCURRENCY = args.concurrency
+    steam.BATCH_SIZE = args.batch_size
+    steam.CYCLE_BUDGET = 0
+
+    bot = steam.SteamPriceBot()
+    bot.bg_task.cancel()
+    bot.catalog_task.cancel()
+    bot.lag_task.cancel()
+    bot.digest_task.cancel()
+
+    async def run():
+        store = StandInStore(args)
+        await store.start()
+        steam.STORE_URL = store.url
+        await bot.open_session()
+
+        try:
+            await bench(bot, store, args)
+        finally:
+            await bot.session.close()
+            await store.stop()
+            bot.parse_executor.shutdown()
+
+        errors = sum(entry[2] for entry in bot.take_errors())
+        print(f'errors recorded: {errors}, quarantined: {len(bot.failures)}, circuit breaker trips: {bot.scheduler.breaker.trips}')
+
+    bot.loop.run_until_complete(run())
+
+
+def main():
+    parser = argparse.ArgumentParser(description='steam.py benchmarks against a local Steam stand-in')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    def online(name, bench, help_):
+        command = commands.add_parser(name, help=help_)
+        command.add_argument('--latency', type=float, default=20, help='stand-in response latency (ms)')
+        command.add_argument('--error-rate', type=float, default=0.0, help='share of responses that are HTTP 500')
+        command.add_argument('--throttle-rate', type=float, default=0.0, help='share of responses that are HTTP 429')
+        command.add_argument('--page-size', type=int, default=200000, help='generated bundle page size (bytes, with --synthetic)')
+        command.add_argument('--fixtures', default=FIXTURES_DIR, help='directory with recorded store responses (default: fixtures/)')
+        command.add_argument('--synthetic', action='store_true', help='serve generated responses instead of the recorded fixtures')
+        command.add_argument('--rps', type=float, default=1000, help='requests_per_second')
+        command.add_argument('--concurrency', type=int, default=50, help='max_concurrency')
+        command.add_argument('--batch-size', type=int, default=100, help='batch_size')
+        command.set_defaults(func=lambda args: run_online(bench, args))
+        return command
+
+    cycle = online('cycle', bench_cycle, 'update_dict over watchlists of different sizes')
+    cycle.add_argument('--sizes', type=int, nargs='+', default=[10, 100, 1000, 10000, 100000])
+    cycle.add_argument('--cold', action='store_true', help='start with no known names (first cycle after adding)')
+
+    bundle = online('bundle', bench_bundle, 'fetch_bundle page fetch and parse')
+    bundle.add_argument('--count', type=int, default=200)
+
+    search = online('search', bench_search, 'search page scraping and local catalog search')
+    search.add_argument('--count', type=int, default=100)
+    search.add_argument('--catalog-size', type=int, default=100000)
+
+    memory = commands.add_parser('memory', help='item_dict memory per product')
+    memory.add_argument('--sizes', type=int, nargs='+', default=[1000, 10000, 100000])
+    memory.set_defaults(func=bench_memory)
+
+    args = parser.parse_args()
+    args.func(args)
+
+
+if __name__ == '__main__':
+    main()
@@ -5,8 +5,23 @@ import json
 import os
 import logging
 import traceback
+import sqlite3
+import html
+import time
+import random
+import contextvars
+import contextlib
+import hashlib
+import socket
+import heapq
+import bisect
+import unicodedata
 import aiohttp
-from collections import OrderedDict
+from aiohttp import web
+from email.utils import parsedate_to_datetime
+from array import array
+from collections import OrderedDict, namedtuple, Counter, deque
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
 from discord.ext import commands
 from discord import Embed, Activity, ActivityType
 from bs4 import BeautifulSoup
@@ -23,7 +38,51 @@ def reset_cfg():
     default = {"bot_token": "",
                "owner_user_id": "",
                "test_mode": False,
-               "interval": 60}
+               "interval": 60,
+               "batch_size": 100,
+               "connection_limit": 100,
+               "connection_limit_per_host": 20,
+               "dns_cache_ttl": 300,
+               "request_timeout": 30,
+               "requests_per_second": 10,
+               "max_concurrency": 10,
+               "max_retries": 3,
+               "backoff_base": 1.0,
+               "cycle_budget": 600,
+               "quarantine_max": 86400,
+               "breaker_window": 60,
+               "breaker_min_requests": 20,
+               "breaker_threshold": 0.5,
+               "breaker_cooldown": 60,
+               "breaker_max_cooldown": 1800,
+               "error_digest_interval": 3600,
+               "price_ttl": 300,
+               "validator_cache_size": 50000,
+               "bundle_json": True,
+               "parse_pool": "thread",
+               "parse_workers": 2,
+               "database": "steam.db",
+               "max_poll_interval": 600,
+               "poll_tick": 10,
+               "sale_windows": [],
+               "specials_feed": True,
+               "specials_pages": 5,
+               "catalog_refresh": 86400,
+               "search_cache_size": 256,
+               "store_language": "koreana",
+               "notify_rate": 1,
+               "notify_burst": 5,
+               "distributed": False,
+               "workers": 2,
+               "coordinator_host": "127.0.0.1",
+               "coordinator_port": 9109,
+               "metrics_host": "127.0.0.1",
+               "metrics_port": 9108,
+               "default_region": "kr",
+               "store_url": "https://store.steampowered.com",
+               "api_url": "https://api.steampowered.com",
+               "community_url": "https://steamcommunity.com",
+               "import_limit": 1000}
 
     with open('config.json', 'w') as f:
         f.write(json.dumps(default, indent=4))
@@ -42,6 +101,50 @@ else:
             OWNER_USER_ID = int(cfg['owner_user_id'])
             TEST_MODE = cfg['test_mode']
             INTERVAL = cfg['interval']
+            BATCH_SIZE = cfg.get('batch_size', 100)
+            CONNECTION_LIMIT = cfg.get('connection_limit', 100)
+            CONNECTION_LIMIT_PER_HOST = cfg.get('connection_limit_per_host', 20)
+            DNS_CACHE_TTL = cfg.get('dns_cache_ttl', 300)
+            REQUEST_TIMEOUT = cfg.get('request_timeout', 30)
+            REQUESTS_PER_SECOND = cfg.get('requests_per_second', 10)  # 스팀 상점에 보내는 초당 요청 수 합계, 스팀 제한보다 낮게 설정 (분산 모드에서는 봇과 워커가 나눠 씀)
+            MAX_CONCURRENCY = cfg.get('max_concurrency', 10)
+            MAX_RETRIES = cfg.get('max_retries', 3)
+            BACKOFF_BASE = cfg.get('backoff_base', 1.0)
+            CYCLE_BUDGET = cfg.get('cycle_budget', 600)
+            QUARANTINE_MAX = cfg.get('quarantine_max', 86400)  # 계속 실패하는 제품을 다시 확인하기까지 최대 대기 시간
+            BREAKER_WINDOW = cfg.get('breaker_window', 60)
+            BREAKER_MIN_REQUESTS = cfg.get('breaker_min_requests', 20)
+            BREAKER_THRESHOLD = cfg.get('breaker_threshold', 0.5)  # 최근 요청 중 실패 비율이 이 이상이면 요청을 멈춤
+            BREAKER_COOLDOWN = cfg.get('breaker_cooldown', 60)
+            BREAKER_MAX_COOLDOWN = cfg.get('breaker_max_cooldown', 1800)
+            ERROR_DIGEST_INTERVAL = cfg.get('error_digest_interval', 3600)
+            PRICE_TTL = cfg.get('price_ttl', 300)
+            VALIDATOR_CACHE_SIZE = cfg.get('validator_cache_size', 50000)
+            BUNDLE_JSON = cfg.get('bundle_json', True)
+            PARSE_POOL = cfg.get('parse_pool', 'thread')
+            PARSE_WORKERS = cfg.get('parse_workers', 2)
+            DATABASE = cfg.get('database', 'steam.db')
+            MAX_POLL_INTERVAL = cfg.get('max_poll_interval', 600)
+            POLL_TICK = cfg.get('poll_tick', 10)
+            SALE_WINDOWS = cfg.get('sale_windows', [])  # [["2026-06-25", "2026-07-09"], ...]
+            SPECIALS_FEED = cfg.get('specials_feed', True)
+            SPECIALS_PAGES = cfg.get('specials_pages', 5)
+            CATALOG_REFRESH = cfg.get('catalog_refresh', 86400)
+            SEARCH_CACHE_SIZE = cfg.get('search_cache_size', 256)
+            STORE_LANGUAGE = cfg.get('store_language', 'koreana')  # 제품 이름을 받아오는 요청에 붙이는 언어 (지정하지 않으면 영어 이름)
+            NOTIFY_RATE = cfg.get('notify_rate', 1)  # 디스코드 채널당 메시지 제한: 5초에 5개
+            NOTIFY_BURST = cfg.get('notify_burst', 5)
+            DISTRIBUTED = cfg.get('distributed', False)  # 가격 확인을 워커 프로세스에 나눠 맡김
+            WORKERS = cfg.get('workers', 2)  # 봇이 직접 실행하는 로컬 워커 수 (다른 서버에서 실행한 워커도 접속 가능)
+            COORDINATOR_HOST = cfg.get('coordinator_host', '127.0.0.1')
+            COORDINATOR_PORT = cfg.get('coordinator_port', 9109)
+            METRICS_HOST = cfg.get('metrics_host', '127.0.0.1')
+            METRICS_PORT = cfg.get('metrics_port', 9108)  # 0이면 메트릭 서버를 열지 않음
+            DEFAULT_REGION = cfg.get('default_region', 'kr')  # 지역을 정하지 않은 서버에서 사용할 스팀 상점 국가 코드
+            STORE_URL = cfg.get('store_url', 'https://store.steampowered.com')  # 벤치마크에서는 로컬 대체 서버를 가리킴
+            API_URL = cfg.get('api_url', 'https://api.steampowered.com')
+            COMMUNITY_URL = cfg.get('community_url', 'https://steamcommunity.com')
+            IMPORT_LIMIT = cfg.get('import_limit', 1000)  # .import 한 번에 추가할 수 있는 최대 제품 수
             print('Loaded config file.')
             print('Test mode:', TEST_MODE)
             print('Interval:', INTERVAL)
@@ -52,60 +155,2281 @@ else:
         reset_cfg()
 
 
-class SteamPriceBot(commands.Bot):
+PriceChange = namedtuple('PriceChange', ['app_id', 'name', 'old', 'new'])
+
+# 응답 본문은 연결을 돌려주기 전에 읽어 두므로 요청이 끝난 뒤에도 사용할 수 있음
+FetchResult = namedtuple('FetchResult', ['status', 'headers', 'url', 'history', 'body'])
+
+MESSAGE_LIMIT = 2 ** 26  # 제품 할당 메시지가 한 줄로 오므로 줄 길이 제한을 넉넉히 둠
+CONTENT_LIMIT = 2000  # 디스코드 메시지 본문 최대 글자 수
+DESCRIPTION_LIMIT = 4096  # 임베드 설명 최대 글자 수
+EMBED_LIMIT = 6000  # 임베드의 제목, 설명, 필드를 합친 최대 글자 수
+
+cycle_deadline = contextvars.ContextVar('cycle_deadline', default=None)
+
+
+class CycleBudgetExceeded(Exception):
+    pass
+
+
+class CircuitOpen(Exception):
+    pass
+
+
+class PriceRecord:
+    # 제품이 많아도 메모리를 적게 쓰도록 슬롯을 사용하고 가격은 최소 단위 정수로 저장함
+    __slots__ = ('name', 'initial', 'initial_formatted', 'final', 'final_formatted', 'on_sale', 'discount_perc')
+
+    def __init__(self, name, initial, initial_formatted, final, final_formatted, on_sale, discount_perc):
+        self.name = sys.intern(name)
+        self.initial = initial
+        self.initial_formatted = sys.intern(initial_formatted)
+        self.final = final
+        self.final_formatted = sys.intern(final_formatted)
+        self.on_sale = on_sale
+        self.discount_perc = discount_perc
+
+    def astuple(self):
+        return (self.name, self.initial, self.initial_formatted, self.final, self.final_formatted, self.on_sale, self.discount_perc)
+
+    def __eq__(self, other):
+        return isinstance(other, PriceRecord) and self.astuple() == other.astuple()
+
+    __hash__ = None
+
+
+class Metrics:
+    buckets = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600)
+    lag_buckets = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 5)
+
+    def __init__(self):
+        self.counters = Counter()
+        self.gauges = {}
+        self.histograms = {}  # (이름, 라벨) -> [구간별 개수, 합계, 개수]
+        self.bucket_sets = {'steam_event_loop_lag_seconds': self.lag_buckets}
+
+    @staticmethod
+    def key(name, labels):
+        # 상태 코드(int)와 예외 이름(str)이 같은 라벨에 섞여도 정렬할 수 있도록 문자열로 저장함
+        return name, tuple(sorted((label, str(value)) for label, value in labels.items()))
+
+    def inc(self, name, value=1, **labels):
+        self.counters[self.key(name, labels)] += value
+
+    def set(self, name, value, **labels):
+        self.gauges[self.key(name, labels)] = value
+
+    def observe(self, name, value, **labels):
+        buckets = self.bucket_sets.get(name, self.buckets)
+        key = self.key(name, labels)
+        histogram = self.histograms.get(key)
+
+        if histogram is None:
+            histogram = self.histograms[key] = [array('L', [0] * (len(buckets) + 1)), 0.0, 0]
+
+        histogram[0][bisect.bisect_left(buckets, value)] += 1
+        histogram[1] += value
+        histogram[2] += 1
+
+    @contextlib.contextmanager
+    def timer(self, name, **labels):
+        start = time.perf_counter()
+
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - start, **labels)
+
+    def counter_values(self, name):
+        return {labels: value for (key, labels), value in self.counters.items() if key == name}
+
+    def gauge(self, name, **labels):
+        return self.gauges.get(self.key(name, labels))
+
+    def summary(self, name):
+        # 라벨별 (개수, 평균, 95번째 백분위수 추정치)
+        buckets = self.bucket_sets.get(name, self.buckets)
+        result = {}
+
+        for (key, labels), (counts, total, count) in self.histograms.items():
+            if key != name or not count:
+                continue
+
+            seen = 0
+
+            for index, bucket_count in enumerate(counts):
+                seen += bucket_count
+
+                if seen >= count * 0.95:
+                    break
+
+            p95 = buckets[index] if index < len(buckets) else float('inf')
+            result[labels] = (count, total / count, p95)
+
+        return result
+
+    @staticmethod
+    def format_labels(labels, extra=()):
+        labels = tuple(labels) + tuple(extra)
+
+        if not labels:
+            return ''
+
+        return '{' + ','.join(f'{key}="{value}"' for key, value in labels) + '}'
+
+    def render(self):
+        lines = []
+
+        for kind, values in (('counter', self.counters), ('gauge', self.gauges)):
+            for name in sorted(set(key for key, _ in values)):
+                lines.append(f'# TYPE {name} {kind}')
+
+                for (key, labels), value in sorted(values.items()):
+                    if key == name:
+                        lines.append(f'{name}{self.format_labels(labels)} {value}')
+
+        for name in sorted(set(key for key, _ in self.histograms)):
+            buckets = self.bucket_sets.get(name, self.buckets)
+            lines.append(f'# TYPE {name} histogram')
+
+            for (key, labels), (counts, total, count) in sorted(self.histograms.items()):
+                if key != name:
+                    continue
+
+                cumulative = 0
+
+                for bucket, bucket_count in zip(buckets + ('+Inf',), counts):
+                    cumulative += bucket_count
+                    lines.append(f'{name}_bucket{self.format_labels(labels, (("le", bucket),))} {cumulative}')
+
+                lines.append(f'{name}_sum{self.format_labels(labels)} {total}')
+                lines.append(f'{name}_count{self.format_labels(labels)} {count}')
+
+        return '\n'.join(lines) + '\n'
+
+
+metrics = Metrics()
+
+
+class RateLimiter:
+    def __init__(self, rate, burst=None):
+        self.rate = rate
+        self.capacity = burst or max(1, rate)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.paused_until = 0
+        self.lock = asyncio.Lock()
+
+    def set_rate(self, rate):
+        self.rate = rate
+        self.capacity = max(1, rate)
+        self.tokens = min(self.tokens, self.capacity)
+
+    def pause(self, seconds):
+        self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+
+    async def acquire(self):
+        async with self.lock:
+            while True:
+                now = time.monotonic()
+
+                if now < self.paused_until:
+                    await asyncio.sleep(self.paused_until - now)
+                    continue
+
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+
+class CircuitBreaker:
+    def __init__(self):
+        self.outcomes = deque()  # (시각, 성공 여부)
+        self.failures = 0
+        self.opened_until = 0
+        self.cooldown = BREAKER_COOLDOWN
+        self.probing = False
+        self.trips = 0
+
+    def is_open(self):
+        return time.monotonic() < self.opened_until
+
+    def allow(self):
+        if self.is_open():
+            return False
+
+        if self.opened_until:  # 대기 시간이 끝나면 요청 하나만 먼저 보내서 회복됐는지 확인
+            if self.probing:
+                return False
+
+            self.probing = True
+
+        return True
+
+    def record(self, ok, generation=None):
+        # generation은 요청을 보낼 때의 trips 값으로, 그 사이에 브레이커가 열렸다면 열리기 전에 보낸 요청이므로 결과를 무시함
+        # (열려 있는 동안 보낸 요청은 확인 요청 하나뿐이므로 그 결과로만 닫거나 다시 엶)
+        if generation is not None and generation != self.trips:
+            return
+
+        now = time.monotonic()
+
+        if self.opened_until:
+            self.probing = False
+
+            if ok:
+                print('Circuit breaker closed.')
+                self.opened_until = 0
+                self.cooldown = BREAKER_COOLDOWN
+            elif ok is not None:
+                self.trip(now)
+
+            return
+
+        if ok is None:  # 요청이 취소되었거나 시간 예산을 넘어 결과를 알 수 없음
+            return
+
+        self.outcomes.append((now, ok))
+        self.failures += not ok
+
+        while self.outcomes[0][0] < now - BREAKER_WINDOW:
+            self.failures -= not self.outcomes.popleft()[1]
+
+        if len(self.outcomes) >= BREAKER_MIN_REQUESTS and self.failures >= len(self.outcomes) * BREAKER_THRESHOLD:
+            self.trip(now)
+
+    def trip(self, now):
+        print(f'Circuit breaker opened for {self.cooldown}s.')
+        self.opened_until = now + self.cooldown
+        self.cooldown = min(self.cooldown * 2, BREAKER_MAX_COOLDOWN)
+        self.outcomes.clear()
+        self.failures = 0
+        self.trips += 1
+        metrics.inc('steam_circuit_breaker_trips_total')
+
+
+class FetchScheduler:
+    retry_status = (403, 429, 500, 502, 503, 504)  # 스팀은 요청이 많으면 429 대신 403을 주기도 함
+
+    def __init__(self, session):
+        self.session = session
+        self.limiter = RateLimiter(REQUESTS_PER_SECOND)
+        self.semaphore = asyncio.Semaphore(MAX_CONCURRENCY)
+        self.validators = OrderedDict()  # URL -> (ETag, Last-Modified, 그 응답 본문의 해시)
+        self.breaker = CircuitBreaker()
+
+    @staticmethod
+    def check_deadline(delay=0):
+        deadline = cycle_deadline.get()
+
+        if deadline is not None and time.monotonic() + delay > deadline:
+            metrics.inc('steam_cycle_budget_exceeded_total')
+            raise CycleBudgetExceeded
+
+    @staticmethod
+    def backoff(attempt):
+        return min(60, BACKOFF_BASE * 2 ** attempt) * random.uniform(0.5, 1)
+
+    @staticmethod
+    def retry_after(r):
+        value = r.headers.get('Retry-After')
+
+        if value is None:
+            return None
+
+        try:
+            return max(0.0, float(value))
+        except ValueError:
+            try:
+                return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+            except (TypeError, ValueError):
+                return None
+
+    async def request(self, method, url, **kwargs):
+        if not self.breaker.allow():  # 스팀 전체에 오류가 잦으면 잠시 요청을 보내지 않음
+            raise CircuitOpen
+
+        generation = self.breaker.trips
+        ok = None
+
+        try:
+            r = await self.send(method, url, **kwargs)
+            ok = True
+            return r
+
+        except aiohttp.ClientResponseError as e:
+            ok = e.status not in self.retry_status  # 404 등은 제품의 문제이므로 상점 오류로 보지 않음
+            raise
+
+        except (aiohttp.ClientError, asyncio.TimeoutError):
+            ok = False
+            raise
+
+        finally:
+            self.breaker.record(ok, generation)
+
+    async def send(self, method, url, **kwargs):
+        attempt = 0
+
+        while True:
+            self.check_deadline()
+            await self.limiter.acquire()
+
+            try:
+                async with self.semaphore:
+                    async with self.session.request(method, url, **kwargs) as r:
+                        result = FetchResult(r.status, r.headers, r.url, r.history, await r.read())
+
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                metrics.inc('steam_http_errors_total', error=type(e).__name__)
+
+                if attempt >= MAX_RETRIES:
+                    raise
+
+                metrics.inc('steam_http_retries_total', reason=type(e).__name__)
+                delay = self.backoff(attempt)
+
+            else:
+                metrics.inc('steam_http_responses_total', status=r.status)
+
+                if r.status not in self.retry_status or attempt >= MAX_RETRIES:
+                    r.raise_for_status()
+                    return result
+
+                metrics.inc('steam_http_retries_total', reason=r.status)
+                delay = self.retry_after(r)
+
+                if delay is None:
+                    delay = self.backoff(attempt)
+                else:
+                    self.limiter.pause(delay)
+
+            attempt += 1
+            self.check_deadline(delay)
+            await asyncio.sleep(delay)
+
+    async def get(self, url, **kwargs):
+        return await self.request('GET', url, **kwargs)
+
+    async def post(self, url, **kwargs):
+        return await self.request('POST', url, **kwargs)
+
+    async def get_if_changed(self, url, digest=None, **kwargs):
+        # digest는 호출한 쪽이 가진 가격을 만든 응답 본문의 해시로, 이번 응답도 같으면 응답 대신 None을 돌려줘서
+        # 디코딩과 파싱을 건너뛰게 함 (digest가 None이면 항상 응답을 돌려줌)
+        validator = self.validators.get(url)
+        headers = dict(kwargs.pop('headers', None) or {})
+
+        if digest is not None and validator is not None and validator[2] == digest:  # 같은 본문과 함께 받은 ETag일 때만 304를 믿을 수 있음
+            etag, last_modified, _ = validator
+
+            if etag:
+                headers['If-None-Match'] = etag
+            if last_modified:
+                headers['If-Modified-Since'] = last_modified
+
+        r = await self.get(url, headers=headers, **kwargs)
+
+        if r.status == 304:
+            self.validators.move_to_end(url)
+            metrics.inc('steam_unchanged_responses_total', reason='not_modified')
+            return None, digest
+
+        body_digest = hashlib.blake2b(r.body, digest_size=16).digest()
+        etag, last_modified = r.headers.get('ETag'), r.headers.get('Last-Modified')
+
+        # 본문 비교는 제품별로 저장한 해시로 하므로 URL은 조건부 요청에 쓸 헤더가 있을 때만 기억함
+        # (연령 확인 페이지 등으로 이동한 응답은 기억하지 않음)
+        if (etag or last_modified) and not r.history:
+            self.validators[url] = (etag, last_modified, body_digest)
+            self.validators.move_to_end(url)
+
+            if len(self.validators) > VALIDATOR_CACHE_SIZE:
+                self.validators.popitem(last=False)
+        else:
+            self.validators.pop(url, None)
+
+        if body_digest == digest:
+            metrics.inc('steam_unchanged_responses_total', reason='same_body')
+            return None, digest
+
+        return r, body_digest
+
+    def forget(self, url):
+        # 파싱에 실패한 응답은 다음에 같은 내용이 와도 다시 파싱하도록 지움
+        self.validators.pop(url, None)
+
+
+# 한 번 설정해 두면 공유 세션의 쿠키로 모든 묶음 상품 페이지에 재사용됨
+AGE_CHECK_COOKIES = {'birthtime': '631152001',
+                     'lastagecheckage': '1-0-1990',
+                     'wants_mature_content': '1'}
+
+PRODUCT_KINDS = {'app': 0, 'sub': 1, 'package': 1, 'bundle': 2}
+FEED_TYPES = {0: 'app', 1: 'sub', 2: 'bundle'}
+
+TAG_PATTERN = re.compile('<[^<>]*>')
+BUNDLE_NAME_PATTERN = re.compile(r'<h2[^>]*class="[^"]*\bpageheader\b[^"]*"[^>]*>(.*?)</h2>', re.S)
+BUNDLE_DISCOUNT_PATTERN = re.compile(r'<div[^>]*class="[^"]*\bdiscount_pct\b[^"]*"[^>]*>(.*?)</div>', re.S)
+BUNDLE_ORIGINAL_PRICE_PATTERN = re.compile(r'<div[^>]*class="[^"]*\bdiscount_original_price\b[^"]*"[^>]*>(.*?)</div>', re.S)
+BUNDLE_FINAL_PRICE_PATTERN = re.compile(r'<div[^>]*class="[^"]*\bdiscount_final_price\b[^"]*"[^>]*>(.*?)</div>', re.S)
+BUNDLE_PRICE_PATTERN = re.compile(r'<div[^>]*class="[^"]*\bgame_purchase_price\b[^"]*"[^>]*>(.*?)</div>', re.S)
+SEARCH_ROW_PATTERN = re.compile(r'<a[^>]*href="https://store\.steampowered\.com/(app|sub|bundle)/([0-9]+)[^"]*"[^>]*>(.*?)</a>', re.S)
+SEARCH_TITLE_PATTERN = re.compile(r'<span[^>]*class="title"[^>]*>(.*?)</span>', re.S)
+PRODUCT_URL_PATTERN = re.compile(r'https://store\.steampowered\.com/(app|sub|bundle)/([0-9]+)')
+WISHLIST_URL_PATTERN = re.compile(r'https://(?:store\.steampowered\.com/wishlist|steamcommunity\.com)/(profiles|id)/([^/\s?#]+)')
+STEAM_ID_PATTERN = re.compile(r'<steamID64>([0-9]+)</steamID64>')
+
+
+def find_text(pattern, content):
+    match = pattern.search(content)
+
+    if match is None:
+        return None
+
+    return html.unescape(TAG_PATTERN.sub('', match.group(1))).strip()
+
+
+def change_embed(batch):
+    if len(batch) == 1:
+        _, change, store_url, reasons = batch[0]
+
+        if change.new.on_sale:
+            description = f'{change.name}이(가) 할인 중입니다! \n\n{change.old.final_formatted} -> {change.new.final_formatted} (-{change.new.discount_perc}%)'
+        else:
+            description = f'{change.name}의 가격이 변경되었습니다. \n\n{change.old.final_formatted} -> {change.new.final_formatted}'
+
+        if reasons:
+            description += '\n\n' + '\n'.join(reasons)
+
+        return Embed(title=change.name[:256],
+                     url=store_url,
+                     description=description[:DESCRIPTION_LIMIT])
+
+    msg = Embed(title=f'{len(batch)}개 제품의 가격이 변경되었습니다.')
+
+    for _, change, store_url, reasons in batch:
+        if change.new.on_sale:
+            value = f'[{change.old.final_formatted} -> {change.new.final_formatted} (-{change.new.discount_perc}%)]({store_url})'
+        else:
+            value = f'[{change.old.final_formatted} -> {change.new.final_formatted}]({store_url})'
+
+        if reasons:
+            value = '\n'.join([value] + reasons)[:1024]
+
+        msg.add_field(name=change.name[:256], value=value, inline=False)
+
+    return msg
+
+
+def mention_chunks(user_ids):
+    chunks = ['']
+
+    for mention in (f'<@{user_id}>' for user_id in sorted(user_ids)):
+        if chunks[-1] and len(chunks[-1]) + 1 + len(mention) > CONTENT_LIMIT:
+            chunks.append('')
+
+        chunks[-1] = f'{chunks[-1]} {mention}' if chunks[-1] else mention
+
+    return chunks
+
+
+def render_changes(batch):
+    # 멘션이 본문 제한을 넘거나 임베드가 6000자를 넘지 않도록 변동을 여러 메시지로 나눔
+    groups = [[]]
+
+    for entry in batch:
+        group = groups[-1] + [entry]
+        mentions = set().union(*[user_ids for user_ids, _, _, _ in group])
+
+        if groups[-1] and (len(mention_chunks(mentions)) > 1 or len(change_embed(group)) > EMBED_LIMIT):
+            groups.append([entry])
+        else:
+            groups[-1] = group
+
+    messages = []
+
+    for group in groups:
+        # 한 제품의 구독자가 너무 많으면 나머지 멘션은 이어지는 메시지로 보냄
+        chunks = mention_chunks(set().union(*[user_ids for user_ids, _, _, _ in group]))
+        messages.append((chunks[0], change_embed(group)))
+        messages += [(chunk, None) for chunk in chunks[1:]]
+
+    return messages
+
+
+class NotificationDispatcher:
+    max_batch = 10  # 한 번에 모으는 가격 변동 수 (글자 수 제한을 넘으면 메시지를 나눠 보냄)
+
+    def __init__(self, render, send):
+        self.render = render  # 가격 변동 묶음 -> [(본문, 임베드)]
+        self.send = send
+        self.queues = {}
+        self.limiters = {}
+        self.workers = {}
+
+    def submit(self, channel_id, user_ids, change, store_url, reasons=()):
+        queue = self.queues.get(channel_id)
+
+        if queue is None:
+            queue = self.queues[channel_id] = asyncio.Queue()
+            self.limiters[channel_id] = RateLimiter(NOTIFY_RATE, NOTIFY_BURST)
+            self.workers[channel_id] = asyncio.ensure_future(self.deliver(channel_id))
+
+        queue.put_nowait((user_ids, change, store_url, reasons))
+
+    async def deliver(self, channel_id):
+        queue = self.queues[channel_id]
+
+        while True:
+            batch = [await queue.get()]
+
+            # 같은 채널에 쌓인 변동은 메시지 하나로 합침
+            while not queue.empty() and len(batch) < self.max_batch:
+                batch.append(queue.get_nowait())
+
+            try:
+                for content, embed in self.render(batch):
+                    await self.limiters[channel_id].acquire()
+                    await self.send(channel_id, content, embed)
+
+                metrics.inc('steam_notifications_total', len(batch), result='sent')
+
+            except Exception:
+                metrics.inc('steam_notifications_total', len(batch), result='failed')
+                print(traceback.format_exc())
+
+    def close(self):
+        for worker in self.workers.values():
+            worker.cancel()
+
+
+class PollScheduler:
+    def __init__(self):
+        self.queue = []  # (due, app_id)
+        self.due = {}
+        self.volatility = {}
+
+    def schedule(self, app_id, delay):
+        due = time.monotonic() + delay
+        self.due[app_id] = due
+        heapq.heappush(self.queue, (due, app_id))
+
+    def spread(self, ids):
+        # 한꺼번에 요청하지 않도록 첫 확인 시각을 INTERVAL 전체에 고르게 나눔
+        for i, app_id in enumerate(ids):
+            self.schedule(app_id, i * INTERVAL / len(ids))
+
+    def remove(self, app_id):
+        self.due.pop(app_id, None)
+        self.volatility.pop(app_id, None)
+
+    def pop_due(self):
+        now = time.monotonic()
+        due = []
+
+        while self.queue and self.queue[0][0] <= now:
+            when, app_id = heapq.heappop(self.queue)
+
+            if self.due.get(app_id) == when:  # 다시 예약되었거나 제거된 제품은 건너뜀
+                del self.due[app_id]
+                due.append(app_id)
+
+        return due
+
+    @staticmethod
+    def in_sale_window():
+        today = time.strftime('%Y-%m-%d')
+        return any(start <= today <= end for start, end in SALE_WINDOWS)
+
+    def reschedule(self, app_id, changed, on_sale):
+        # 최근 가격 변동이 잦을수록 자주 확인하고, 변동이 없으면 점점 간격을 늘림
+        volatility = self.volatility.get(app_id, 0) * 0.5 + (1 if changed else 0)
+        self.volatility[app_id] = volatility
+
+        if on_sale or self.in_sale_window():
+            interval = INTERVAL
+        else:
+            interval = max(INTERVAL, MAX_POLL_INTERVAL / (1 + 4 * volatility))
+
+        self.schedule(app_id, interval * random.uniform(0.9, 1.1))
+
+
+class AlertRules:
+    # 규칙을 제품별로 기준값 순으로 정렬해 두고, 가격이 바뀐 제품에서 새로 넘은 구간의 규칙만 찾음
+    def __init__(self):
+        self.rules = {}  # rule_id -> (제품 키, user_id, channel, 종류, 기준값)
+        self.by_key = {}  # 제품 키 -> {rule_id}
+        self.thresholds = {'below': {}, 'discount': {}}  # 종류 -> 제품 키 -> [(기준값, rule_id)] 오름차순
+        self.lowest = {}  # 제품 키 -> {rule_id}
+        self.lowest_price = {}  # 제품 키 -> 지금까지의 최저가
+
+    def add(self, rule_id, key, user_id, channel, kind, threshold):
+        self.rules[rule_id] = (key, user_id, channel, kind, threshold)
+        self.by_key.setdefault(key, set()).add(rule_id)
+
+        if kind == 'lowest':
+            self.lowest.setdefault(key, set()).add(rule_id)
+        else:
+            bisect.insort(self.thresholds[kind].setdefault(key, []), (threshold, rule_id))
+
+    def remove(self, rule_id):
+        key, _, _, kind, threshold = self.rules.pop(rule_id)
+        self.by_key[key].discard(rule_id)
+
+        if not self.by_key[key]:
+            del self.by_key[key]
+
+        if kind == 'lowest':
+            groups = self.lowest
+            groups[key].discard(rule_id)
+        else:
+            groups = self.thresholds[kind]
+            del groups[key][bisect.bisect_left(groups[key], (threshold, rule_id))]
+
+        if not groups[key]:
+            del groups[key]
+
+        if key not in self.lowest:
+            self.lowest_price.pop(key, None)
+
+    def drop(self, key, user_id=None):
+        removed = [rule_id for rule_id in self.by_key.get(key, ()) if user_id is None or self.rules[rule_id][1] == user_id]
+
+        for rule_id in removed:
+            self.remove(rule_id)
+
+        return removed
+
+    def by_user(self, user_id):
+        return sorted((rule_id, rule) for rule_id, rule in self.rules.items() if rule[1] == user_id)
+
+    def evaluate(self, changes):
+        fired = []
+
+        for change in changes:
+            key, old, new = change.app_id, change.old, change.new
+
+            if key not in self.by_key:
+                continue
+
+            # 이전 가격 > 기준 가격 >= 새 가격
+            rules = self.thresholds['below'].get(key)
+
+            if rules and new.final < old.final:
+                start = bisect.bisect_left(rules, (new.final,))
+                end = bisect.bisect_left(rules, (old.final,))
+                fired += [(self.rules[rule_id], change) for _, rule_id in rules[start:end]]
+
+            # 이전 할인율 < 기준 할인율 <= 새 할인율
+            rules = self.thresholds['discount'].get(key)
+
+            if rules and new.discount_perc > old.discount_perc:
+                start = bisect.bisect_left(rules, (old.discount_perc + 1,))
+                end = bisect.bisect_left(rules, (new.discount_perc + 1,))
+                fired += [(self.rules[rule_id], change) for _, rule_id in rules[start:end]]
+
+            if key in self.lowest:
+                lowest = self.lowest_price.get(key, old.final)
+
+                if new.final < lowest:
+                    fired += [(self.rules[rule_id], change) for rule_id in sorted(self.lowest[key])]
+
+                self.lowest_price[key] = min(lowest, new.final)
+
+        return fired
+
+
+def normalize_name(name):
+    return unicodedata.normalize('NFKC', name).casefold().strip()
+
+
+def name_trigrams(name):
+    padded = f' {name} '  # 단어 시작 부분이 더 잘 맞도록 공백을 붙임
+    return set(padded[i:i + 3] for i in range(len(padded) - 2))
+
+
+def build_catalog_index(names):
+    postings = {}
+
+    for appid, name in names.items():
+        for trigram in name_trigrams(normalize_name(name)):
+            postings.setdefault(trigram, []).append(appid)
+
+    trigrams = {trigram: array('I', appids) for trigram, appids in postings.items()}
+    prefixes = sorted((normalize_name(name), appid) for appid, name in names.items())
+
+    return trigrams, prefixes
+
+
+class Catalog:
+    def __init__(self):
+        self.names = {}  # appid -> 이름 (GetAppList)
+        self.local_names = {}  # appid -> 상점에서 받은 이름 (한국어 이름 포함)
+        self.trigrams = {}  # trigram -> array of appid
+        self.prefixes = []  # (정규화된 이름, appid) 정렬 목록
+        self.cache = OrderedDict()
+
+    def replace(self, names, index):
+        self.names = names
+        self.trigrams, self.prefixes = index
+        self.cache.clear()
+
+    def index_name(self, appid, name):
+        normalized = normalize_name(name)
+
+        for trigram in name_trigrams(normalized):
+            self.trigrams.setdefault(trigram, array('I')).append(appid)
+
+        bisect.insort(self.prefixes, (normalized, appid))
+
+    def update(self, added, removed):
+        # 제거되거나 이름이 바뀐 제품의 예전 색인은 검색할 때 걸러냄
+        for appid in removed:
+            self.names.pop(appid, None)
+
+        for appid, name in added.items():
+            self.names[appid] = name
+            self.index_name(appid, name)
+
+        self.cache.clear()
+
+    def add_local_name(self, appid, name):
+        if self.local_names.get(appid) == name or self.names.get(appid) == name:
+            return
+
+        self.local_names[appid] = name
+        self.index_name(appid, name)
+        self.cache.clear()
+
+    def score(self, appid, query, trigrams):
+        best = None
+
+        for name in (self.names.get(appid), self.local_names.get(appid)):
+            if not name:
+                continue
+
+            normalized = normalize_name(name)
+            score = len(trigrams & name_trigrams(normalized)) / len(trigrams)
+
+            if normalized.startswith(query):
+                score += 1
+            elif query in normalized:
+                score += 0.5
+
+            if best is None or score > best:
+                best = score
+
+        return best
+
+    def search(self, query, limit=10):
+        query = normalize_name(query)
+
+        if not query:
+            return []
+
+        if query in self.cache:
+            self.cache.move_to_end(query)
+            return self.cache[query]
+
+        if len(query) < 3:
+            candidates = []
+            i = bisect.bisect_left(self.prefixes, (query,))
+
+            while i < len(self.prefixes) and self.prefixes[i][0].startswith(query) and len(candidates) < limit * 20:
+                candidates.append(self.prefixes[i][1])
+                i += 1
+        else:
+            hits = Counter()
+
+            for trigram in name_trigrams(query):
+                hits.update(self.trigrams.get(trigram, ()))
+
+            candidates = [appid for appid, _ in hits.most_common(limit * 20)]
+
+        trigrams = name_trigrams(query)
+        scored = []
+
+        for appid in set(candidates):
+            score = self.score(appid, query, trigrams)
+
+            if score is not None and score >= 0.3:  # 겹치는 부분이 너무 적은 이름은 제외
+                name = self.local_names.get(appid) or self.names[appid]
+                scored.append((-score, len(name), appid, name))
+
+        scored.sort()
+        results = [(str(appid), name) for _, _, appid, name in scored[:limit]]
+
+        self.cache[query] = results
+
+        if len(self.cache) > SEARCH_CACHE_SIZE:
+            self.cache.popitem(last=False)
+
+        return results
+
+
+def is_transient(e):
+    # 연결 오류나 과부하 응답은 제품이 아니라 상점 쪽 문제로 봄
+    if isinstance(e, aiohttp.ClientResponseError):
+        return e.status in FetchScheduler.retry_status
+
+    return isinstance(e, (aiohttp.ClientError, asyncio.TimeoutError, CircuitOpen))
+
+
+def format_date(timestamp):
+    return time.strftime('%Y-%m-%d', time.localtime(timestamp))
+
+
+def format_seconds(seconds):
+    if seconds == float('inf'):
+        return '-'
+
+    return f'{seconds * 1000:.0f}ms' if seconds < 1 else f'{seconds:.1f}s'
+
+
+def format_counts(values):
+    return ', '.join(f'{labels[0][1]}: {value}' for labels, value in sorted(values.items())) or '없음'
+
+
+def chunks(seq, size):
+    for i in range(0, len(seq), size):
+        yield seq[i:i + size]
+
+
+def parse_formatted_price(formatted):
+    # 가격 문자열을 최소 단위(센트, 전 등) 정수로 변환
+    digits = re.sub('[^0-9]', '', formatted)
+
+    if not digits:
+        return 0
+
+    if re.search('[.,][0-9]{2}(?![0-9])', formatted):  # 소수점 아래 두 자리가 있는 통화
+        return int(digits)
+
+    return int(digits) * 100
+
+
+# 스팀 상점 국가 코드 -> 통화
+REGION_CURRENCIES = {'kr': 'KRW', 'us': 'USD', 'jp': 'JPY', 'gb': 'GBP', 'de': 'EUR', 'fr': 'EUR',
+                     'ca': 'CAD', 'au': 'AUD', 'cn': 'CNY', 'tw': 'TWD', 'hk': 'HKD', 'br': 'BRL'}
+
+# 통화 -> (앞에 붙는 기호, 뒤에 붙는 기호, 소수점 아래 자릿수)
+CURRENCY_FORMATS = {'KRW': ('₩ ', '', 0), 'USD': ('$', '', 2), 'JPY': ('¥ ', '', 0), 'GBP': ('£', '', 2),
+                    'EUR': ('', '€', 2), 'CAD': ('CDN$ ', '', 2), 'AUD': ('A$ ', '', 2), 'CNY': ('¥ ', '', 2),
+                    'TWD': ('NT$ ', '', 0), 'HKD': ('HK$ ', '', 2), 'BRL': ('R$ ', '', 2)}
+
+
+def product_key(app_id, cc):
+    # 같은 제품도 지역마다 따로 가격을 확인하므로 제품 ID와 지역을 함께 키로 사용
+    return f'{app_id}:{cc}'
+
+
+def split_key(key):
+    app_id, _, cc = key.partition(':')
+    return app_id, cc or DEFAULT_REGION
+
+
+def format_price(price, currency='KRW'):
+    prefix, suffix, decimals = CURRENCY_FORMATS.get(currency, (f'{currency} ', '', 2))
+
+    if decimals:
+        amount = f'{price / 100:,.2f}'
+    else:
+        amount = format(price // 100, ',d')
+
+    if currency == 'EUR':  # 1.234,56€
+        amount = amount.replace(',', ' ').replace('.', ',').replace(' ', '.')
+
+    return f'{prefix}{amount}{suffix}'
+
+
+def parse_app_price(price):
+    initial = price['initial']
+    final = price['final']
+
+    initial_formatted = price['initial_formatted']
+    final_formatted = price['final_formatted']
+    discount_perc = price['discount_percent']
+
+    return initial, initial_formatted, final, final_formatted, bool(discount_perc), discount_perc
+
+
+def parse_package_price(price):
+    initial = price['initial']
+    final = price['final']
+
+    currency = price.get('currency', 'KRW')
+    initial_formatted = format_price(initial, currency)
+    final_formatted = format_price(final, currency)
+    discount_perc = price['discount_percent']
+
+    return initial, initial_formatted, final, final_formatted, bool(discount_perc), discount_perc
+
+
+def parse_search_page(content):
+    soup = BeautifulSoup(content, 'html.parser')
+
+    names = [TAG_PATTERN.sub('', str(name)) for name in soup.select('div.responsive_search_name_combined > div.col.search_name.ellipsis > span')]
+    urls = [str(url['href']) for url in soup.select('#search_resultsRows > a')]
+    prices = [TAG_PATTERN.sub('', str(price)).strip() or '가격 없음' for price in soup.find_all('div', class_='col search_price responsive_secondrow')]
+
+    return list(zip(names, urls, prices))
+
+
+def parse_specials_page(content):
+    records = []
+
+    for url_type, app_id, row in SEARCH_ROW_PATTERN.findall(content):
+        name = find_text(SEARCH_TITLE_PATTERN, row)
+        discount_perc = find_text(BUNDLE_DISCOUNT_PATTERN, row)
+        initial_formatted = find_text(BUNDLE_ORIGINAL_PRICE_PATTERN, row)
+        final_formatted = find_text(BUNDLE_FINAL_PRICE_PATTERN, row)
+
+        if not (name and discount_perc and initial_formatted and final_formatted):
+            continue
+
+        initial = parse_formatted_price(initial_formatted)
+        final = parse_formatted_price(final_formatted)
+        discount_perc = int(re.sub('[^0-9]', '', discount_perc))
+
+        records.append((url_type, app_id, name, (initial, initial_formatted, final, final_formatted, True, discount_perc)))
+
+    return records
+
+
+def parse_bundle_json(bundle):
+    initial_formatted = bundle['formatted_orig_price']
+    final_formatted = bundle['formatted_final_price']
+    discount_perc = bundle.get('discount_percent') or 0
+
+    initial = parse_formatted_price(initial_formatted)
+    final = parse_formatted_price(final_formatted)
+
+    return initial, initial_formatted, final, final_formatted, bool(discount_perc), discount_perc
+
+
+def parse_bundle_page(content):
+    content = content.decode('utf-8', 'replace')
+    name = find_text(BUNDLE_NAME_PATTERN, content)
+
+    if name is None:
+        raise ValueError('Bundle name not found')
+
+    discount_perc = find_text(BUNDLE_DISCOUNT_PATTERN, content)
+    final_formatted = find_text(BUNDLE_FINAL_PRICE_PATTERN, content) or find_text(BUNDLE_PRICE_PATTERN, content)
+    initial_formatted = find_text(BUNDLE_ORIGINAL_PRICE_PATTERN, content) or final_formatted
+
+    if final_formatted is None:
+        raise ValueError('Bundle price not found')
+
+    if discount_perc:
+        on_sale = True
+        discount_perc = int(re.sub('[^0-9]', '', discount_perc))
+    else:
+        on_sale = False
+        discount_perc = 0
+
+    initial = parse_formatted_price(initial_formatted)
+    final = parse_formatted_price(final_formatted)
+
+    return name, initial, initial_formatted, final, final_formatted, on_sale, discount_perc
+
+
+class Storage:
+    def __init__(self, path):
+        self.db = sqlite3.connect(path)
+        self.db.execute('PRAGMA journal_mode=WAL')
+        self.db.execute('PRAGMA synchronous=NORMAL')
+        self.db.execute('PRAGMA foreign_keys=ON')
+        self.db.executescript('''
+            CREATE TABLE IF NOT EXISTS products (
+                product_id TEXT PRIMARY KEY,
+                type TEXT NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS subscriptions (
+                product_id TEXT NOT NULL REFERENCES products(product_id) ON DELETE CASCADE,
+                user_id INTEGER NOT NULL,
+                guild INTEGER NOT NULL,
+                channel INTEGER NOT NULL,
+                PRIMARY KEY (product_id, user_id, channel)
+            );
+            CREATE INDEX IF NOT EXISTS subscriptions_user ON subscriptions (user_id, guild);
+            CREATE INDEX IF NOT EXISTS subscriptions_channel ON subscriptions (channel);
+            CREATE TABLE IF NOT EXISTS price_history (
+                kind INTEGER NOT NULL,
+                product_id INTEGER NOT NULL,
+                region TEXT NOT NULL,
+                recorded_at INTEGER NOT NULL,
+                final INTEGER NOT NULL,
+                discount_perc INTEGER NOT NULL,
+                PRIMARY KEY (kind, product_id, region, recorded_at)
+            ) WITHOUT ROWID;
+            CREATE INDEX IF NOT EXISTS price_history_final ON price_history (kind, product_id, region, final, recorded_at);
+            CREATE TABLE IF NOT EXISTS alert_rules (
+                rule_id INTEGER PRIMARY KEY AUTOINCREMENT,
+                product_id TEXT NOT NULL REFERENCES products(product_id) ON DELETE CASCADE,
+                user_id INTEGER NOT NULL,
+                channel INTEGER NOT NULL,
+                kind TEXT NOT NULL,
+                threshold INTEGER
+            );
+            CREATE INDEX IF NOT EXISTS alert_rules_product ON alert_rules (product_id, user_id);
+            CREATE TABLE IF NOT EXISTS guild_regions (
+                guild INTEGER PRIMARY KEY,
+                region TEXT NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS catalog (
+                appid INTEGER PRIMARY KEY,
+                name TEXT NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS prices (
+                product_id TEXT PRIMARY KEY REFERENCES products(product_id) ON DELETE CASCADE,
+                name TEXT NOT NULL,
+                initial INTEGER,
+                initial_formatted TEXT,
+                final INTEGER,
+                final_formatted TEXT,
+                on_sale INTEGER,
+                discount_perc INTEGER,
+                updated_at REAL
+            );
+        ''')
+
+    def migrate_json(self, path):
+        if not os.path.isfile(path) or self.db.execute('SELECT 1 FROM products LIMIT 1').fetchone():
+            return
+
+        with open(path, 'r') as f:
+            id_dict = json.loads(f.read())
+
+        with self.db:
+            self.db.executemany('INSERT OR IGNORE INTO products VALUES (?, ?)',
+                                [(key, value['type']) for key, value in id_dict.items()])
+            self.db.executemany('INSERT OR IGNORE INTO subscriptions VALUES (?, ?, ?, ?)',
+                                [(key, value['user_id'], value['guild'], value['channel']) for key, value in id_dict.items()])
+
+        os.replace(path, path + '.migrated')
+        print(f'Migrated {len(id_dict)} products from {path}.')
+
+    def migrate_regions(self, region):
+        # added_products.json에서 옮겨 온 제품처럼 지역 구분이 없는 제품은 기본 지역의 것으로 옮김
+        with self.db:
+            self.db.execute('PRAGMA defer_foreign_keys=ON')
+
+            for table in ('products', 'subscriptions', 'prices'):
+                self.db.execute(f"UPDATE {table} SET product_id = product_id || ':' || ? WHERE instr(product_id, ':') = 0", (region,))
+
+    def load_guild_regions(self):
+        return dict(self.db.execute('SELECT guild, region FROM guild_regions'))
+
+    def set_guild_region(self, guild, region):
+        with self.db:
+            self.db.execute('INSERT OR REPLACE INTO guild_regions VALUES (?, ?)', (guild, region))
+
+    def load_watchlist(self):
+        id_dict = OrderedDict()
+        subscribers = {}
+
+        for product_id, url_type in self.db.execute('SELECT product_id, type FROM products ORDER BY rowid'):
+            id_dict[product_id] = {'type': url_type}
+
+        for product_id, user_id, channel in self.db.execute('SELECT product_id, user_id, channel FROM subscriptions'):
+            subscribers.setdefault(product_id, {}).setdefault(channel, set()).add(user_id)
+
+        return id_dict, subscribers
+
+    def add_products(self, rows):
+        # rows: [(product_id, type, user_id, guild, channel)] 를 한 트랜잭션으로 추가함
+        with self.db:
+            self.db.executemany('INSERT OR IGNORE INTO products VALUES (?, ?)', [row[:2] for row in rows])
+            self.db.executemany('INSERT OR IGNORE INTO subscriptions VALUES (?, ?, ?, ?)', [(row[0], *row[2:]) for row in rows])
+
+    def remove_product(self, product_id):
+        with self.db:
+            self.db.execute('DELETE FROM products WHERE product_id = ?', (product_id,))
+
+    def remove_subscription(self, product_id, user_id):
+        with self.db:
+            self.db.execute('DELETE FROM subscriptions WHERE product_id = ? AND user_id = ?', (product_id, user_id))
+            self.db.execute('DELETE FROM alert_rules WHERE product_id = ? AND user_id = ?', (product_id, user_id))
+            self.db.execute('DELETE FROM products WHERE product_id = ? AND NOT EXISTS (SELECT 1 FROM subscriptions WHERE product_id = ?)',
+                            (product_id, product_id))
+
+    def products_by_user(self, user_id, guild=None):
+        if guild is None:
+            rows = self.db.execute('SELECT product_id FROM subscriptions WHERE user_id = ? GROUP BY product_id ORDER BY MIN(rowid)', (user_id,))
+        else:
+            rows = self.db.execute('SELECT product_id FROM subscriptions WHERE user_id = ? AND guild = ? GROUP BY product_id ORDER BY MIN(rowid)', (user_id, guild))
+
+        return [row[0] for row in rows]
+
+    def products_by_channel(self, channel):
+        return [row[0] for row in self.db.execute('SELECT product_id FROM subscriptions WHERE channel = ? GROUP BY product_id ORDER BY MIN(rowid)', (channel,))]
+
+    def load_alerts(self):
+        return self.db.execute('SELECT rule_id, product_id, user_id, channel, kind, threshold FROM alert_rules').fetchall()
+
+    def add_alert(self, product_id, user_id, channel, kind, threshold):
+        with self.db:
+            return self.db.execute('INSERT INTO alert_rules (product_id, user_id, channel, kind, threshold) VALUES (?, ?, ?, ?, ?)',
+                                   (product_id, user_id, channel, kind, threshold)).lastrowid
+
+    def remove_alert(self, rule_id):
+        with self.db:
+            self.db.execute('DELETE FROM alert_rules WHERE rule_id = ?', (rule_id,))
+
+    def load_prices(self):
+        rows = self.db.execute('SELECT product_id, name, initial, initial_formatted, final, final_formatted, on_sale, discount_perc, updated_at FROM prices')
+        return {row[0]: (row[1:8], row[8]) for row in rows}
+
+    def save_prices(self, rows):
+        with self.db:
+            self.db.executemany('INSERT OR REPLACE INTO prices VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)', rows)
+
+    def touch_prices(self, product_ids, updated_at):
+        with self.db:
+            self.db.executemany('UPDATE prices SET updated_at = ? WHERE product_id = ?', [(updated_at, product_id) for product_id in product_ids])
+
+    def record_history(self, rows):
+        # 마지막으로 기록된 가격과 같으면 기록하지 않음
+        with self.db:
+            self.db.executemany('''
+                INSERT OR REPLACE INTO price_history
+                SELECT :kind, :product_id, :region, :recorded_at, :final, :discount_perc
+                WHERE NOT EXISTS (
+                    SELECT 1 FROM (
+                        SELECT final, discount_perc FROM price_history
+                        WHERE kind = :kind AND product_id = :product_id AND region = :region
+                        ORDER BY recorded_at DESC LIMIT 1
+                    ) WHERE final = :final AND discount_perc = :discount_perc
+                )
+            ''', rows)
+
+    def lowest_price(self, kind, product_id, region):
+        return self.db.execute('SELECT final, recorded_at FROM price_history WHERE kind = ? AND product_id = ? AND region = ? ORDER BY final, recorded_at DESC LIMIT 1',
+                               (kind, product_id, region)).fetchone()
+
+    def last_sale(self, kind, product_id, region):
+        return self.db.execute('SELECT final, discount_perc, recorded_at FROM price_history WHERE kind = ? AND product_id = ? AND region = ? AND discount_perc > 0 ORDER BY recorded_at DESC LIMIT 1',
+                               (kind, product_id, region)).fetchone()
+
+    def price_history(self, kind, product_id, region, limit=10):
+        return self.db.execute('SELECT final, discount_perc, recorded_at FROM price_history WHERE kind = ? AND product_id = ? AND region = ? ORDER BY recorded_at DESC LIMIT ?',
+                               (kind, product_id, region, limit)).fetchall()
+
+    def load_catalog(self):
+        return dict(self.db.execute('SELECT appid, name FROM catalog'))
+
+    def update_catalog(self, added, removed):
+        with self.db:
+            self.db.executemany('INSERT OR REPLACE INTO catalog VALUES (?, ?)', added.items())
+            self.db.executemany('DELETE FROM catalog WHERE appid = ?', [(appid,) for appid in removed])
+
+    def close(self):
+        self.db.close()
+
+
+class PriceFetcher:
+    # 가격을 불러오는 부분만 따로 모아 디스코드 봇과 분산 워커가 함께 사용함
     def __init__(self):
-        super().__init__('.')
+        self.id_dict = OrderedDict()
         self.item_dict = OrderedDict()
+        self.price_changes = []
+        self.fetched_at = {}
+        self.refresh_tasks = set()
+        self.inflight = {}
+        self.full_refresh = None
+        self.poller = PollScheduler()
+        self.specials_at = 0
+        self.specials_covered = set()
+        self.dirty_prices = set()
+        self.checked_prices = set()
+        self.failures = {}  # app_id -> (연속 실패 횟수, 마지막 실패 시각)
+        self.digests = {}  # app_id -> 지금 가격을 만든 상점 응답 본문의 해시 (할인 목록 등 다른 경로로 바뀐 가격은 없음)
+        self.skipped = set()  # 서킷 브레이커나 주기 시간 제한 때문에 요청하지 못한 제품
+        self.error_counts = Counter()  # (제품 유형, 오류) -> 횟수
+        self.error_samples = {}  # (제품 유형, 오류) -> 오류가 난 제품 ID 몇 개
+        self.session = None
+        self.scheduler = None
+
+        # HTML 파싱은 이벤트 루프를 막지 않도록 별도의 풀에서 실행
+        if PARSE_POOL == 'process':
+            self.parse_executor = ProcessPoolExecutor(PARSE_WORKERS)
+        else:
+            self.parse_executor = ThreadPoolExecutor(PARSE_WORKERS)
+
+    def watch(self, key, url_type, record=None, age=None):
+        app_id, cc = split_key(key)
+        self.id_dict[key] = {'type': url_type, 'id': app_id, 'cc': cc}
+        self.item_dict[key] = record  # None이면 아직 가격을 불러오지 않은 제품
+
+        if record is not None:
+            self.fetched_at[key] = time.monotonic() - age  # 저장된 시각 기준으로 TTL을 계산
+
+    def forget(self, app_id):
+        del self.item_dict[app_id]
+        del self.id_dict[app_id]
+        self.fetched_at.pop(app_id, None)
+        self.dirty_prices.discard(app_id)
+        self.checked_prices.discard(app_id)
+        self.poller.remove(app_id)
+        self.specials_covered.discard(app_id)
+        self.failures.pop(app_id, None)
+        self.digests.pop(app_id, None)
+
+    def quarantine(self, app_id):
+        count = self.failures.get(app_id, (0, 0))[0] + 1
+        self.failures[app_id] = (count, time.monotonic())
+
+    def quarantine_delay(self, app_id):
+        # 판매 중지 등으로 계속 실패하는 제품은 확인 간격을 두 배씩 늘려서 자주 요청하지 않음
+        return min(QUARANTINE_MAX, INTERVAL * 2 ** self.failures[app_id][0])
+
+    def add_error(self, url_type, summary, ids, count=1):
+        key = (url_type, summary)
+        self.error_counts[key] += count
+        samples = self.error_samples.setdefault(key, [])
+
+        for app_id in ids:
+            if len(samples) >= 5:
+                break
+
+            if app_id not in samples:
+                samples.append(app_id)
+
+    def take_errors(self):
+        entries = [[url_type, summary, count, self.error_samples.get((url_type, summary), [])]
+                   for (url_type, summary), count in self.error_counts.most_common()]
+        self.error_counts.clear()
+        self.error_samples.clear()
+        return entries
+
+    async def open_session(self):
+        connector = aiohttp.TCPConnector(limit=CONNECTION_LIMIT,
+                                         limit_per_host=CONNECTION_LIMIT_PER_HOST,
+                                         ttl_dns_cache=DNS_CACHE_TTL)
+        self.session = aiohttp.ClientSession(connector=connector,
+                                             cookies=AGE_CHECK_COOKIES,
+                                             timeout=aiohttp.ClientTimeout(total=REQUEST_TIMEOUT))
+        self.scheduler = FetchScheduler(self.session)
+
+    async def refresh_items(self, ids):
+        now = time.monotonic()
+        missing = [key for key in ids if self.item_dict.get(key) is None]
+        stale = [key for key in ids if key not in missing and now - self.fetched_at.get(key, 0) > PRICE_TTL]
+
+        if stale:  # 오래된 가격은 일단 그대로 보여주고 백그라운드에서 갱신
+            task = self.loop.create_task(self.update_dict(stale))
+            self.refresh_tasks.add(task)
+            task.add_done_callback(self.refresh_tasks.discard)
+
+        if missing:
+            await self.update_dict(missing)
+
+    async def update_dict(self, ids=None):
+        if ids is not None:
+            await self.fetch_items(ids)
+            return
+
+        # 전체 갱신이 이미 진행 중이면 새로 시작하지 않고 그 결과를 기다림
+        if self.full_refresh is None or self.full_refresh.done():
+            self.full_refresh = asyncio.ensure_future(self.fetch_items(list(self.id_dict)))
+
+        await asyncio.shield(self.full_refresh)
+
+    async def fetch_items(self, ids):
+        # 지역별로 나눠서 묶어 요청함 (지역 -> 제품 키 목록)
+        app_ids = {}
+        package_ids = {}
+        bundle_ids = {}
+        others = []
+        waiting = []
+        owned = []
+
+        for key in ids:
+            value = self.id_dict.get(key)
+
+            if value is None:
+                continue
+
+            # (종류, ID, 지역) 별로 진행 중인 요청이 있으면 같은 결과를 기다림
+            flight_key = (value['type'], value['id'], value['cc'])
+            future = self.inflight.get(flight_key)
+
+            if future is not None:
+                waiting.append(future)
+                continue
+
+            future = self.loop.create_future()
+            self.inflight[flight_key] = future
+            owned.append((flight_key, future))
+
+            if value['type'] == 'app' and self.item_dict.get(key) is not None:
+                # price_overview 필터로는 이름을 받을 수 없으므로 이름을 이미 아는 앱만 묶어서 요청
+                app_ids.setdefault(value['cc'], []).append(key)
+            elif value['type'] in ('sub', 'package'):
+                package_ids.setdefault(value['cc'], []).append(key)
+            elif value['type'] == 'bundle' and BUNDLE_JSON:
+                bundle_ids.setdefault(value['cc'], []).append(key)
+            else:
+                others.append((key, value['type']))
+
+        tasks = []
+
+        for fetch, groups in ((self.fetch_app_prices, app_ids), (self.fetch_package_prices, package_ids), (self.fetch_bundle_prices, bundle_ids)):
+            for cc, keys in groups.items():
+                # 같은 제품 묶음이면 URL도 같아지도록 정렬해서 나눔 (조건부 요청과 응답 비교에 사용)
+                keys.sort(key=lambda key: int(split_key(key)[0]))
+                tasks += [fetch(batch, cc) for batch in chunks(keys, BATCH_SIZE)]
+
+        tasks += [self.fetch_steam(key, url_type) for key, url_type in others]
+
+        try:
+
+            await asyncio.gather(*tasks)
+
+        finally:
+            for flight_key, future in owned:
+                del self.inflight[flight_key]
+
+                if not future.done():
+                    future.set_result(None)
+
+        if waiting:
+            await asyncio.gather(*[asyncio.shield(future) for future in waiting])
+
+    async def fetch_app_prices(self, keys, cc):
+        app_ids = [split_key(key)[0] for key in keys]
+        url = f'{STORE_URL}/api/appdetails?appids={",".join(app_ids)}&cc={cc}&filters=price_overview'
+
+        try:
+            with metrics.timer('steam_fetch_seconds', type='app', mode='batch'):
+                r, digest = await self.scheduler.get_if_changed(url, self.known_digest(keys))
+
+                if r is None:
+                    self.mark_unchanged(keys)
+                    return
+
+                data = json.loads(r.body)
+
+        except Exception as e:
+            self.scheduler.forget(url)
+            self.report_error(keys, e, 'app')
+            return
+
+        for key, app_id in zip(keys, app_ids):
+            try:
+                price = parse_app_price(data[app_id]['data']['price_overview'])
+                self.store_price(key, self.item_dict[key].name, *price, digest=digest)
+
+            except Exception as e:
+                self.scheduler.forget(url)
+                self.report_error([key], e, 'app')
+
+    async def fetch_package_prices(self, keys, cc):
+        package_ids = [split_key(key)[0] for key in keys]
+        url = f'{STORE_URL}/api/packagedetails?packageids={",".join(package_ids)}&cc={cc}&l={STORE_LANGUAGE}'
+
+        try:
+            with metrics.timer('steam_fetch_seconds', type='package', mode='batch'):
+                r, digest = await self.scheduler.get_if_changed(url, self.known_digest(keys))
+
+                if r is None:
+                    self.mark_unchanged(keys)
+                    return
+
+                data = json.loads(r.body)
+
+        except Exception as e:
+            self.scheduler.forget(url)
+            self.report_error(keys, e, 'package')
+            return
+
+        for key, package_id in zip(keys, package_ids):
+            try:
+                package = data[package_id]['data']
+                self.store_price(key, package['name'], *parse_package_price(package['price']), digest=digest)
+
+            except Exception as e:
+                self.scheduler.forget(url)
+                self.report_error([key], e, 'package')
+
+    def known_digest(self, ids):
+        # 모든 제품의 가격이 같은 응답에서 나왔을 때만 그 응답의 해시를 돌려줌
+        # 가격을 아직 모르거나 할인 목록 등 다른 경로로 바뀐 제품이 있으면 응답이 같아도 파싱해야 함
+        digests = set(self.digests.get(app_id) for app_id in ids)
+        return digests.pop() if len(digests) == 1 else None
+
+    def mark_unchanged(self, ids):
+        now = time.monotonic()
+
+        for app_id in ids:
+            if self.item_dict.get(app_id) is not None:
+                self.fetched_at[app_id] = now
+                self.checked_prices.add(app_id)
+                self.failures.pop(app_id, None)
+
+    async def run_cycle(self, due):
+        print(f'Starting price check... ({len(due)} products)')
+        started = time.monotonic()
+        token = cycle_deadline.set(started + CYCLE_BUDGET if CYCLE_BUDGET else None)
+        self.skipped.clear()
+
+        try:
+            # 할인 목록에서 이미 가격을 갱신한 제품은 따로 불러오지 않음
+            await self.ingest_specials()
+            fetched = [app_id for app_id in due if app_id not in self.specials_covered]
+            await self.update_dict(fetched)
+            self.specials_covered.difference_update(due)
+        finally:
+            cycle_deadline.reset(token)
+            metrics.observe('steam_cycle_seconds', time.monotonic() - started)
+
+        changes, self.price_changes = self.price_changes, []
+        changed = set(change.app_id for change in changes)
+        skipped, self.skipped = self.skipped, set()
+
+        for app_id in due:
+            if app_id not in self.id_dict:
+                continue
+
+            if app_id in skipped:  # 확인하지 못했으므로 간격을 늘리지 않고 다음 틱에 다시 확인
+                self.poller.schedule(app_id, POLL_TICK)
+            elif app_id in self.failures and self.failures[app_id][1] >= started:  # 이번 주기에 실패한 제품
+                self.poller.schedule(app_id, self.quarantine_delay(app_id))
+            else:
+                last = self.item_dict.get(app_id)
+                self.poller.reschedule(app_id, app_id in changed, last is not None and last.on_sale)
+
+        metrics.inc('steam_cycles_total', result='ok')
+        metrics.inc('steam_cycle_items_total', len(due), source='due')
+        metrics.inc('steam_cycle_items_total', len(fetched), source='fetched')
+        metrics.inc('steam_cycle_items_total', len(changes), source='changed')
+        metrics.set('steam_last_cycle_items', len(due))
+        metrics.set('steam_last_cycle_seconds', time.monotonic() - started)
+        metrics.set('steam_last_cycle_timestamp', int(time.time()))
+
+        print(f'Price check ended successfully. ({len(changes)} changes)')
+        return changes
+
+    def report_error(self, ids, e, url_type):
+        if isinstance(e, (CycleBudgetExceeded, CircuitOpen)):  # 다음 주기에 다시 불러옴
+            self.skipped.update(ids)
+            return
+
+        if not isinstance(e, (aiohttp.ClientError, asyncio.TimeoutError)):  # 요청 실패는 FetchScheduler에서 셈
+            metrics.inc('steam_parse_failures_total', type=url_type)
+
+        print(traceback.format_exc())
+        self.add_error(url_type, f'{type(e).__name__}: {e}'[:200], ids)  # 소유자에게는 주기적으로 모아서 보냄
+
+        if len(ids) == 1 and not is_transient(e):  # 제품 자체의 문제로 보이면 격리
+            self.quarantine(ids[0])
+
+    def store_price(self, app_id, name, initial, initial_formatted, final, final_formatted, on_sale, discount_perc, digest=None):
+        if app_id not in self.item_dict:  # 가격을 불러오는 사이에 제거된 제품
+            return
+
+        last = self.item_dict[app_id]
+        record = PriceRecord(name, initial, initial_formatted, final, final_formatted, on_sale, discount_perc)
+
+        if last != record:
+            self.dirty_prices.add(app_id)
+        else:
+            self.checked_prices.add(app_id)
+
+        if last is not None and last.final != final:
+            self.price_changes.append(PriceChange(app_id, name, last, record))
+
+        self.item_dict[app_id] = record
+        self.fetched_at[app_id] = time.monotonic()
+        self.failures.pop(app_id, None)
+
+        if digest is not None:
+            self.digests[app_id] = digest
+        else:
+            self.digests.pop(app_id, None)
+
+    async def fetch_specials(self, cc):
+        records = []
+        r = await self.scheduler.get(f'{STORE_URL}/api/featuredcategories?cc={cc}&l={STORE_LANGUAGE}')
+
+        for item in json.loads(r.body)['specials']['items']:
+            url_type = FEED_TYPES.get(item.get('type'))
+
+            if url_type is None or not item.get('discounted'):
+                continue
+
+            price = {'initial': item['original_price'], 'final': item['final_price'], 'discount_percent': item['discount_percent'], 'currency': item.get('currency', 'KRW')}
+            records.append((url_type, str(item['id']), item['name'], parse_package_price(price)))
+
+        # 대규모 할인 기간에는 할인 중인 제품 검색 결과를 여러 페이지 훑음
+        if PollScheduler.in_sale_window():
+            for page in range(SPECIALS_PAGES):
+                r = await self.scheduler.get(f'{STORE_URL}/search/results/?specials=1&json=1&infinite=1&start={page * 100}&count=100&cc={cc}&l={STORE_LANGUAGE}')
+                data = json.loads(r.body)
+                records += await self.parse(parse_specials_page, data['results_html'])
+
+                if (page + 1) * 100 >= data.get('total_count', 0):
+                    break
+
+        return records
+
+    async def ingest_specials(self):
+        if not SPECIALS_FEED or time.monotonic() - self.specials_at < INTERVAL:
+            return
+
+        self.specials_at = time.monotonic()
+        covered = set()
+
+        # 감시 중인 제품이 있는 지역마다 할인 목록을 한 번씩 훑음
+        for cc in sorted(set(value['cc'] for value in self.id_dict.values())):
+            try:
+                records = await self.fetch_specials(cc)
+
+            except Exception:
+                print(traceback.format_exc())
+                continue
+
+            for url_type, app_id, name, price in records:
+                key = product_key(app_id, cc)
+                info = self.id_dict.get(key)
+
+                if info is None or PRODUCT_KINDS[info['type']] != PRODUCT_KINDS[url_type]:
+                    continue
+
+                item = self.item_dict[key]
+                self.store_price(key, item.name if item else name, *price)
+                covered.add(key)
+
+        # 이번 목록에서 빠진 제품은 할인이 끝났을 수 있으므로 다음 차례에 직접 확인함
+        self.specials_covered = covered
+
+    async def fetch_bundle_prices(self, keys, cc):
+        bundle_ids = [split_key(key)[0] for key in keys]
+        url = f'{STORE_URL}/actions/ajaxresolvebundles?bundleids={",".join(bundle_ids)}&cc={cc}&l={STORE_LANGUAGE}'
+        resolved = {}
+
+        try:
+            with metrics.timer('steam_fetch_seconds', type='bundle', mode='batch'):
+                r, digest = await self.scheduler.get_if_changed(url, self.known_digest(keys))
+
+                if r is None:
+                    self.mark_unchanged(keys)
+                    return
+
+                for bundle in json.loads(r.body):
+                    resolved[str(bundle['bundleid'])] = bundle
+
+        except (CycleBudgetExceeded, CircuitOpen) as e:
+            self.report_error(keys, e, 'bundle')
+            return
+
+        except Exception:  # 실패한 묶음 상품은 상점 페이지에서 가져옴
+            self.scheduler.forget(url)
+            print(traceback.format_exc())
+
+        fallback = []
+
+        for key, bundle_id in zip(keys, bundle_ids):
+            try:
+                bundle = resolved[bundle_id]
+                self.store_price(key, bundle['name'], *parse_bundle_json(bundle), digest=digest)
+
+            except Exception:
+                self.scheduler.forget(url)
+
+                if bundle_id in resolved:  # 응답은 받았지만 형식이 맞지 않는 경우
+                    metrics.inc('steam_parse_failures_total', type='bundle')
+
+                fallback.append(self.fetch_steam(key, 'bundle'))
+
+        await asyncio.gather(*fallback)
+
+    async def fetch_bundle(self, key, digest=None):
+        app_id, cc = split_key(key)
+        url = f'{STORE_URL}/bundle/{app_id}?cc={cc}&l={STORE_LANGUAGE}'
+        r, digest = await self.scheduler.get_if_changed(url, digest)
+
+        if r is None:  # 페이지가 그대로면 HTML을 다시 파싱하지 않음
+            return None, digest
+
+        if '/agecheck' in r.url.path:  # 연령 확인 쿠키가 통하지 않을 때만 직접 연령 확인을 거침
+            session_id = next((cookie.value for cookie in self.session.cookie_jar if cookie.key == 'sessionid'), '')
+            await self.scheduler.post(f'{STORE_URL}/agecheckset/bundle/{app_id}/', data={'sessionid': session_id, 'ageDay': '1', 'ageMonth': 'January', 'ageYear': '1990'})
+            r, digest = await self.scheduler.get_if_changed(url)
+
+        return await self.parse(parse_bundle_page, r.body), digest
+
+    async def parse(self, func, *args):
+        return await self.loop.run_in_executor(self.parse_executor, func, *args)
+
+    async def fetch_steam(self, key, url_type, return_value=False):
+        app_id, cc = split_key(key)
+
+        if url_type == 'sub':
+            url_type = 'package'
+
+        if url_type == 'bundle':
+            url = f'{STORE_URL}/bundle/{app_id}?cc={cc}&l={STORE_LANGUAGE}'
+        else:
+            url = f'{STORE_URL}/api/{url_type}details?{url_type}ids={app_id}&cc={cc}&l={STORE_LANGUAGE}'
+
+        # 명령어에서 바로 결과가 필요하면 응답이 같아도 파싱함
+        known = None if return_value else self.known_digest([key])
+
+        try:
+            with metrics.timer('steam_fetch_seconds', type=url_type, mode='single'):
+                if url_type == 'bundle':
+                    result, digest = await self.fetch_bundle(key, known)
+
+                    if result is None:
+                        self.mark_unchanged([key])
+                        return
+
+                    name, initial, initial_formatted, final, final_formatted, on_sale, discount_perc = result
+
+                else:
+                    r, digest = await self.scheduler.get_if_changed(url, known)
+
+                    if r is None:
+                        self.mark_unchanged([key])
+                        return
+
+                    data = json.loads(r.body)[app_id]['data']
+                    name = data['name']
+
+                    if url_type == 'app':
+                        initial, initial_formatted, final, final_formatted, on_sale, discount_perc = parse_app_price(data['price_overview'])
+
+                    elif url_type == 'package':
+                        initial, initial_formatted, final, final_formatted, on_sale, discount_perc = parse_package_price(data['price'])
+
+                    else:
+                        return
+
+        except Exception as e:
+            self.scheduler.forget(url)
+
+            if return_value:
+                print(traceback.format_exc())
+                return False
+            else:
+                self.report_error([key], e, url_type)
+                return
+
+        if return_value:
+            return name, final_formatted
+
+        else:
+            self.store_price(key, name, initial, initial_formatted, final, final_formatted, on_sale, discount_perc, digest=digest)
+
+
+class HashRing:
+    replicas = 100  # 워커마다 링에 올리는 가상 노드 수 (많을수록 고르게 나뉨)
+
+    def __init__(self):
+        self.points = []  # 정렬된 해시값
+        self.nodes = {}  # 해시값 -> 워커 이름
+
+    @staticmethod
+    def hash(key):
+        return int.from_bytes(hashlib.blake2b(key.encode(), digest_size=8).digest(), 'big')
+
+    def add(self, node):
+        for i in range(self.replicas):
+            point = self.hash(f'{node}#{i}')
+
+            if point not in self.nodes:
+                bisect.insort(self.points, point)
+                self.nodes[point] = node
+
+    def remove(self, node):
+        self.points = [point for point in self.points if self.nodes[point] != node]
+        self.nodes = {point: name for point, name in self.nodes.items() if name != node}
+
+    def owner(self, key):
+        if not self.points:
+            return None
+
+        index = bisect.bisect(self.points, self.hash(key)) % len(self.points)
+        return self.nodes[self.points[index]]
+
+
+# 코디네이터와 워커는 한 줄에 JSON 메시지 하나씩 주고받음
+def send_message(writer, message):
+    writer.write(json.dumps(message, ensure_ascii=False).encode() + b'\n')
+
+
+async def read_message(reader):
+    line = await reader.readline()
+    return json.loads(line) if line else None
+
+
+class Coordinator:
+    def __init__(self, bot):
+        self.bot = bot
+        self.ring = HashRing()
+        self.workers = {}  # 워커 이름 -> StreamWriter
+        self.server = None
+        self.local_workers = []
+
+    async def start(self):
+        self.server = await asyncio.start_server(self.handle, COORDINATOR_HOST, COORDINATOR_PORT, limit=MESSAGE_LIMIT)
+        print(f'Waiting for fetch workers on {COORDINATOR_HOST}:{COORDINATOR_PORT}')
+
+        for index in range(WORKERS):
+            self.local_workers.append(asyncio.ensure_future(self.supervise(index)))
+
+    async def supervise(self, index):
+        # 로컬 워커 프로세스가 종료되면 다시 실행함
+        host = '127.0.0.1' if COORDINATOR_HOST in ('', '0.0.0.0') else COORDINATOR_HOST
+
+        while True:
+            process = await asyncio.create_subprocess_exec(sys.executable, os.path.abspath(__file__), '--worker', f'{host}:{COORDINATOR_PORT}')
+
+            try:
+                code = await process.wait()
+
+            except asyncio.CancelledError:
+                process.terminate()
+                await process.wait()
+                raise
+
+            print(f'Local worker {index} exited with code {code}, restarting...')
+            await asyncio.sleep(5)
+
+    def owner(self, app_id):
+        return self.ring.owner(app_id)
+
+    def send(self, name, message):
+        writer = self.workers.get(name)
+
+        if writer is not None:
+            send_message(writer, message)
+
+    def assignment(self, ids):
+        now = time.monotonic()
+        products = []
+
+        for app_id in ids:
+            record = self.bot.item_dict.get(app_id)
+
+            if record is None:
+                products.append([app_id, self.bot.id_dict[app_id]['type'], None, None])
+            else:
+                products.append([app_id, self.bot.id_dict[app_id]['type'], record.astuple(), now - self.bot.fetched_at.get(app_id, 0)])
+
+        return {'op': 'assign', 'products': products}
+
+    def assign(self, app_id):
+        name = self.owner(app_id)
+
+        if name is None:
+            return False
+
+        self.send(name, self.assignment([app_id]))
+        return True
+
+    def drop(self, app_id):
+        name = self.owner(app_id)
+
+        if name is not None:
+            self.send(name, {'op': 'drop', 'products': [app_id]})
+
+    def share_rate(self):
+        # 봇과 워커가 requests_per_second를 똑같이 나눠 써서 합계가 스팀 제한을 넘지 않게 함
+        # (워커 수가 바뀔 때마다 다시 나누며, 다른 서버에서 실행한 워커도 같은 몫을 받음)
+        rate = REQUESTS_PER_SECOND / (len(self.workers) + 1)
+        self.bot.scheduler.limiter.set_rate(rate)
+
+        for name in self.workers:
+            self.send(name, {'op': 'rate', 'requests_per_second': rate})
+
+    def rebalance(self, change):
+        # 링이 바뀌기 전후의 담당 워커를 비교해 옮겨야 하는 제품만 다시 나눔
+        before = {app_id: self.owner(app_id) for app_id in self.bot.id_dict}
+        change()
+        self.share_rate()
+
+        added = {}
+        dropped = {}
+        orphans = []
+
+        for app_id, old in before.items():
+            new = self.owner(app_id)
+
+            if new == old:
+                continue
+
+            if old in self.workers:
+                dropped.setdefault(old, []).append(app_id)
+
+            if new is None:
+                orphans.append(app_id)
+            else:
+                added.setdefault(new, []).append(app_id)
+
+        for name, ids in dropped.items():
+            self.send(name, {'op': 'drop', 'products': ids})
+
+        for name, ids in added.items():
+            self.send(name, self.assignment(ids))
+
+        if orphans:  # 남은 워커가 없으면 봇이 직접 확인함
+            self.bot.poller.spread(orphans)
+
+        metrics.set('steam_workers', len(self.workers))
+        return len(orphans) + sum(len(ids) for ids in added.values())
+
+    async def handle(self, reader, writer):
+        try:
+            hello = await read_message(reader)
+
+        except (ConnectionError, ValueError):
+            hello = None
+
+        if not hello or hello.get('op') != 'hello':
+            writer.close()
+            return
+
+        name = hello['name']
+        reconnected = name in self.workers
+
+        if reconnected:  # 같은 이름으로 다시 연결한 워커는 이전 연결을 닫음
+            self.workers[name].close()
+
+        self.workers[name] = writer
+        moved = self.rebalance(lambda: self.ring.add(name))
+
+        if reconnected:
+            # 링은 그대로라 옮길 제품이 없지만 워커는 연결이 끊길 때 맡은 제품을 모두 비웠으므로 전부 다시 보냄
+            ids = [app_id for app_id in self.bot.id_dict if self.owner(app_id) == name]
+            self.send(name, self.assignment(ids))
+            moved += len(ids)
+
+        print(f'Worker {name} joined. ({len(self.workers)} workers, {moved} products moved)')
+
+        try:
+            while True:
+                message = await read_message(reader)
+
+                if message is None:
+                    break
+
+                try:
+                    await self.receive(name, message)
+                except Exception:
+                    print(traceback.format_exc())
+
+        except (ConnectionError, ValueError):
+            print(traceback.format_exc())
+
+        finally:
+            if self.workers.get(name) is writer:
+                del self.workers[name]
+                moved = self.rebalance(lambda: self.ring.remove(name))
+                print(f'Worker {name} left. ({len(self.workers)} workers, {moved} products moved)')
+
+            writer.close()
+
+    async def receive(self, name, message):
+        if message['op'] == 'prices':
+            # 가격 변동 비교와 저장, 알림은 코디네이터에서만 함
+            for app_id, *price in message['records']:
+                self.bot.store_price(app_id, *price)
+
+            metrics.inc('steam_worker_prices_total', len(message['records']), worker=name)
+            changes, self.bot.price_changes = self.bot.price_changes, []
+            self.bot.notify_changes(changes)
+            self.bot.save_prices()
+
+        elif message['op'] == 'errors':  # 워커의 오류도 봇의 오류 요약에 합침
+            for url_type, summary, count, ids in message['entries']:
+                self.bot.add_error(url_type, f'[{name}] {summary}', ids, count)
+
+    async def close(self):
+        for task in self.local_workers:
+            task.cancel()
+
+        await asyncio.gather(*self.local_workers, return_exceptions=True)
+
+        if self.server is not None:
+            self.server.close()
+
+        for writer in self.workers.values():
+            writer.close()
+
+
+class PriceWorker(PriceFetcher):
+    def __init__(self, address):
+        super().__init__()
+        self.host, self.port = address.rsplit(':', 1)
+        self.name = f'{socket.gethostname()}-{os.getpid()}'
+        self.loop = asyncio.get_event_loop()
+        self.writer = None
+
+    def receive(self, message):
+        if message['op'] == 'assign':
+            added = []
+
+            for app_id, url_type, record, age in message['products']:
+                self.watch(app_id, url_type, PriceRecord(*record) if record else None, age)
+                added.append(app_id)
+
+            self.poller.spread(added)
+            print(f'Assigned {len(added)} products. ({len(self.id_dict)} total)')
+
+        elif message['op'] == 'drop':
+            for app_id in message['products']:
+                if app_id in self.id_dict:
+                    self.forget(app_id)
+
+        elif message['op'] == 'rate':
+            self.scheduler.limiter.set_rate(message['requests_per_second'])
+            print(f'Request rate set to {message["requests_per_second"]:.2f}/s.')
+
+    async def poll(self):
+        while True:
+            await asyncio.sleep(POLL_TICK)
+
+            if self.scheduler.breaker.is_open():  # 스팀 오류가 잦으면 예정된 확인을 미룸
+                continue
+
+            due = [app_id for app_id in self.poller.pop_due() if app_id in self.id_dict]
+
+            if not due:
+                continue
+
+            try:
+                await self.run_cycle(due)
+
+            except Exception as e:
+                metrics.inc('steam_cycles_total', result='failed')
+                print(f'Price check failed with exception {e}')
+
+            # 변동 여부는 코디네이터가 판단하므로 새로 확인한 가격을 모두 보냄
+            fresh = self.dirty_prices | self.checked_prices
+            self.dirty_prices.clear()
+            self.checked_prices.clear()
+            records = [[app_id, *self.item_dict[app_id].astuple()] for app_id in fresh if self.item_dict.get(app_id) is not None]
+
+            errors = self.take_errors()
+
+            if self.writer is not None:
+                if records:
+                    send_message(self.writer, {'op': 'prices', 'records': records})
+                if errors:
+                    send_message(self.writer, {'op': 'errors', 'entries': errors})
+
+                await self.writer.drain()
+
+    async def run(self):
+        await self.open_session()
+
+        while True:
+            try:
+                reader, self.writer = await asyncio.open_connection(self.host, int(self.port), limit=MESSAGE_LIMIT)
+                send_message(self.writer, {'op': 'hello', 'name': self.name})
+                print(f'Connected to coordinator at {self.host}:{self.port} as {self.name}')
+                poll_task = self.loop.create_task(self.poll())
+
+                try:
+                    while True:
+                        message = await read_message(reader)
+
+                        if message is None:
+                            break
+
+                        self.receive(message)
+
+                finally:
+                    poll_task.cancel()
+                    self.writer.close()
+                    self.writer = None
+
+            except (OSError, ValueError) as e:
+                print(f'Lost connection to coordinator: {e}')
+
+            # 연결이 끊기면 코디네이터가 다른 워커에 제품을 다시 나눠주므로 맡은 제품을 비움
+            for app_id in list(self.id_dict):
+                self.forget(app_id)
+
+            await asyncio.sleep(5)
+
+    async def close(self):
+        if self.session is not None:
+            await self.session.close()
+
+        self.parse_executor.shutdown(wait=False)
+
+
+class SteamPriceBot(commands.Bot, PriceFetcher):
+    def __init__(self):
+        super().__init__('.')
+        PriceFetcher.__init__(self)
+        self.catalog = Catalog()
+        self.dispatcher = NotificationDispatcher(render_changes, self.send_notification)
+        self.coordinator = Coordinator(self) if DISTRIBUTED else None
+        self.metrics_runner = None
+
+        self.storage = Storage(DATABASE)
+        self.storage.migrate_json('added_products.json')
+        self.storage.migrate_regions(DEFAULT_REGION)
+        self.guild_regions = self.storage.load_guild_regions()  # guild_id -> 지역 코드
+        watchlist, self.subscribers = self.storage.load_watchlist()  # subscribers: app_id -> {channel: {user_id}}
+
+        # 마지막으로 저장한 가격을 불러와 재시작 직후에도 명령어와 가격 변동 비교가 바로 동작하도록 함
+        snapshot = self.storage.load_prices()
+
+        for app_id, value in watchlist.items():
+            if app_id in snapshot:
+                (name, initial, initial_formatted, final, final_formatted, on_sale, discount_perc), updated_at = snapshot[app_id]
+                record = PriceRecord(name, initial, initial_formatted, final, final_formatted, bool(on_sale), discount_perc)
+                self.watch(app_id, value['type'], record, max(0, time.time() - updated_at))
+            else:
+                self.watch(app_id, value['type'])
+
+        print(f'Loaded {len(snapshot)} saved prices for {len(self.id_dict)} products.')
+
+        self.alerts = AlertRules()
+
+        for rule in self.storage.load_alerts():
+            self.alerts.add(*rule)
+
+        for key in self.alerts.lowest:
+            self.load_lowest_price(key)
+
+        self.remove_command('help')
+        self.add_bot_commands()
+        self.bg_task = self.loop.create_task(self.check_price())
+        self.catalog_task = self.loop.create_task(self.refresh_catalog())
+        self.lag_task = self.loop.create_task(self.monitor_loop())
+        self.digest_task = self.loop.create_task(self.send_error_digest())
+
+    def remove_item(self, app_id):
+        self.forget(app_id)
+        self.subscribers.pop(app_id, None)
+        self.alerts.drop(app_id)
+        self.storage.remove_product(app_id)
+
+        if self.coordinator is not None:
+            self.coordinator.drop(app_id)
+
+    def item_name(self, key):
+        app_id, cc = split_key(key)
+        item = self.item_dict.get(key)
+        name = item.name if item else app_id
+
+        if cc != DEFAULT_REGION:
+            name += f' [{cc.upper()}]'
+
+        return name
+
+    def store_url(self, key):
+        product = self.id_dict[key]
+        return f'https://store.steampowered.com/{product["type"]}/{product["id"]}?cc={product["cc"]}'
+
+    def region_for(self, guild):
+        if guild is None:
+            return DEFAULT_REGION
+
+        return self.guild_regions.get(guild.id, DEFAULT_REGION)
 
-        try:
-            with open('added_products.json', 'r') as f:
-                self.id_dict = json.loads(f.read(), object_pairs_hook=OrderedDict)
+    def store_price(self, key, name, *price, digest=None):
+        super().store_price(key, name, *price, digest=digest)
 
-            for app_id in self.id_dict.keys():
-                self.item_dict[str(app_id)] = {}
+        if key in self.id_dict and self.id_dict[key]['type'] == 'app':
+            self.catalog.add_local_name(int(self.id_dict[key]['id']), name)
 
-        except FileNotFoundError:
-            print('added_products.json not found. Creating one!')
-            with open('added_products.json', 'w') as f:
-                f.write(json.dumps({}, indent=4))
-            self.id_dict = OrderedDict()
+    def load_lowest_price(self, key):
+        product = self.id_dict[key]
+        row = self.storage.lowest_price(PRODUCT_KINDS[product['type']], int(product['id']), product['cc'])
 
-        self.remove_command('help')
-        self.add_bot_commands()
-        self.bg_task = self.loop.create_task(self.check_price())
+        if row is not None:
+            self.alerts.lowest_price[key] = row[0]
 
-    def save_id_dict(self):
-        with open('added_products.json', 'w') as f:
-            f.write(json.dumps(self.id_dict, indent=4))
+    def describe_alert(self, key, kind, threshold):
+        if kind == 'below':
+            return f'{format_price(threshold, REGION_CURRENCIES.get(split_key(key)[1], "KRW"))} 이하'
+        elif kind == 'discount':
+            return f'{threshold}% 이상 할인'
+        else:
+            return '역대 최저가 갱신'
 
-    def parse_url(self, input_url):
-        if re.match('https://store.steampowered.com/app/[0-9]+', input_url):
-            app_id = re.findall('app/([0-9]+)', str(input_url))[0]
-            url_type = 'app'
+    async def report_to_owner(self, message):
+        await self.owner.send(message)
 
-        elif re.match('https://store.steampowered.com/sub/[0-9]+', input_url):
-            app_id = re.findall()('sub/([0-9]+)', str(input_url))[0]
-            url_type = 'sub'
+    def add_item(self, app_id, url_type, user_id, guild, channel):
+        self.add_items([(app_id, url_type, None)], user_id, guild, channel)
 
-        elif re.match('https://store.steampowered.com/bundle/[0-9]+', input_url):
-            app_id = re.findall('bundle/([0-9]+)', str(input_url))[0]
-            url_type = 'bundle'
+    def add_items(self, products, user_id, guild, channel):
+        # products: [(제품 키, 종류, 확인한 가격 또는 None)]
+        for app_id, url_type, record in products:
+            # 같은 제품을 여러 사용자가 추가해도 가격은 한 번만 불러옴
+            if app_id not in self.id_dict:
+                if record is None:
+                    self.watch(app_id, url_type)
+                else:  # 추가하면서 이미 확인한 가격은 그대로 사용함
+                    self.watch(app_id, url_type, record, 0)
+                    self.dirty_prices.add(app_id)
 
-        else:
+                if self.coordinator is None or not self.coordinator.assign(app_id):  # 연결된 워커가 없으면 직접 확인
+                    self.poller.schedule(app_id, 0 if record is None else INTERVAL)
+
+            self.subscribers.setdefault(app_id, {}).setdefault(channel, set()).add(user_id)
+
+        self.storage.add_products([(app_id, url_type, user_id, guild, channel) for app_id, url_type, _ in products])
+
+    def remove_subscription(self, app_id, user_id):
+        channels = self.subscribers.get(app_id, {})
+
+        for channel in list(channels):
+            channels[channel].discard(user_id)
+
+            if not channels[channel]:
+                del channels[channel]
+
+        self.storage.remove_subscription(app_id, user_id)
+        self.alerts.drop(app_id, user_id)
+
+        if not channels:
+            self.remove_item(app_id)
+
+    def save_prices(self):
+        rows = []
+        history = []
+        now = int(time.time())
+
+        for key in self.dirty_prices:
+            item = self.item_dict.get(key)
+
+            if item:
+                product = self.id_dict[key]
+                rows.append((key, *item.astuple(), now))
+                history.append({'kind': PRODUCT_KINDS[product['type']],
+                                'product_id': int(product['id']),
+                                'region': product['cc'],
+                                'recorded_at': now,
+                                'final': item.final,
+                                'discount_perc': item.discount_perc})
+
+        # 가격은 그대로지만 새로 확인한 제품은 확인 시각만 갱신함
+        checked = [app_id for app_id in self.checked_prices if app_id not in self.dirty_prices]
+
+        self.dirty_prices.clear()
+        self.checked_prices.clear()
+        self.storage.save_prices(rows)
+        self.storage.touch_prices(checked, now)
+        self.storage.record_history(history)
+
+    def parse_url(self, input_url):
+        match = PRODUCT_URL_PATTERN.match(str(input_url))
+
+        if match is None:
             return None, None
 
+        url_type, app_id = match.groups()
         return app_id, url_type
 
+    def parse_urls(self, text):
+        # 글 전체에서 상점 URL을 한 번에 찾음 (중복 제외, 입력 순서 유지)
+        return list(OrderedDict.fromkeys((app_id, url_type) for url_type, app_id in PRODUCT_URL_PATTERN.findall(text)))
+
+    async def fetch_wishlist(self, kind, name):
+        if kind == 'id':  # 사용자 지정 URL은 프로필에서 스팀 ID를 찾음
+            r = await self.scheduler.get(f'{COMMUNITY_URL}/id/{name}/?xml=1')
+            steam_id = find_text(STEAM_ID_PATTERN, r.body.decode('utf-8', 'replace'))
+        else:
+            steam_id = name
+
+        if not steam_id or not steam_id.isdigit():
+            return None
+
+        r = await self.scheduler.get(f'{API_URL}/IWishlistService/GetWishlist/v1/?steamid={steam_id}')
+        items = json.loads(r.body).get('response', {}).get('items')
+
+        if items is None:  # 비공개이거나 없는 찜 목록
+            return None
+
+        return [(str(item['appid']), 'app') for item in items]
+
+    async def validate_products(self, products, cc):
+        # 종류별로 묶어서 동시에 확인함: 제품 키 -> 가격 (이름을 모르면 None), 없거나 판매하지 않는 제품은 빠짐
+        groups = {}
+        valid = {}
+
+        for app_id, url_type in products:
+            groups.setdefault(url_type, []).append(app_id)
+
+        await asyncio.gather(*[self.validate_batch(url_type, batch, cc, valid)
+                               for url_type, ids in groups.items() for batch in chunks(ids, BATCH_SIZE)])
+        return valid
+
+    async def validate_batch(self, url_type, ids, cc, valid):
+        if url_type == 'app':
+            url = f'{STORE_URL}/api/appdetails?appids={",".join(ids)}&cc={cc}&filters=price_overview'
+        elif url_type == 'sub':
+            url = f'{STORE_URL}/api/packagedetails?packageids={",".join(ids)}&cc={cc}&l={STORE_LANGUAGE}'
+        else:
+            url = f'{STORE_URL}/actions/ajaxresolvebundles?bundleids={",".join(ids)}&cc={cc}&l={STORE_LANGUAGE}'
+
+        try:
+            r = await self.scheduler.get(url)
+            data = json.loads(r.body)
+
+            if url_type == 'bundle':
+                data = {str(bundle['bundleid']): bundle for bundle in data}
+
+        except Exception:
+            print(traceback.format_exc())
+            data = {}
+
+        fallback = []
+
+        for app_id in ids:
+            try:
+                if url_type == 'app':
+                    name = self.catalog.local_names.get(int(app_id)) or self.catalog.names.get(int(app_id))
+                    price = parse_app_price(data[app_id]['data']['price_overview'])
+                elif url_type == 'sub':
+                    package = data[app_id]['data']
+                    name = package['name']
+                    price = parse_package_price(package['price'])
+                else:
+                    name = data[app_id]['name']
+                    price = parse_bundle_json(data[app_id])
+
+            except Exception:
+                if url_type == 'bundle':  # 묶음으로 확인하지 못한 묶음 상품은 상점 페이지로 확인
+                    fallback.append(app_id)
+
+                continue
+
+            # 이름을 모르는 앱은 추가한 뒤 가격 확인 때 이름을 불러옴
+            valid[product_key(app_id, cc)] = PriceRecord(name, *price) if name else None
+
+        results = await asyncio.gather(*[self.fetch_steam(product_key(app_id, cc), 'bundle', return_value=True) for app_id in fallback])
+
+        for app_id, result in zip(fallback, results):
+            if result:
+                valid[product_key(app_id, cc)] = None
+
     def add_bot_commands(self):
         @self.command(name='help')
         async def help_(ctx):
             await ctx.message.delete()
             help_msg = Embed(title='명령어 도움말',
-                             description='.add [상점 URL]  -  해당 제품을 추가합니다.\n.search [제품 이름]  -  해당 이름으로 검색하여 제품을 추가합니다.\n.remove  -  자신이 추가한 제품을 제거합니다.\n.list  -  추가된 제품 목록을 확인합니다.\n\n<소유자 전용>\n.removeall  -  모든 사용자의 제품을 제거합니다.\n.listall  -  모든 사용자가 추가한 제품을 확인합니다.')
+                             description='.add [상점 URL] (지역)  -  해당 제품을 추가합니다.\n.search [제품 이름]  -  해당 이름으로 검색하여 제품을 추가합니다. (한국어 이름은 추가된 제품과 이전에 검색된 제품만 바로 찾고, 나머지는 스팀 상점에서 검색합니다)\n.import [상점 URL 목록 또는 찜 목록 URL]  -  여러 제품을 한 번에 추가합니다. (텍스트 파일 첨부 가능)\n.remove  -  자신이 추가한 제품을 제거합니다.\n.list  -  추가된 제품 목록을 확인합니다.\n.history [상점 URL 또는 ID] (지역)  -  제품의 가격 변동 기록을 확인합니다.\n.region (지역)  -  서버의 기본 상점 지역을 확인하거나 변경합니다.\n.alert  -  목표 가격, 할인율, 역대 최저가 알림을 설정합니다.\n\n<소유자 전용>\n.removeall  -  모든 사용자의 제품을 제거합니다.\n.listall  -  모든 사용자가 추가한 제품을 확인합니다.\n.stats  -  가격 확인 주기와 요청 통계를 확인합니다.')
             await ctx.channel.send(embed=help_msg, delete_after=30.0)
 
         @self.command()
-        async def add(ctx, input_url=None):
+        async def add(ctx, input_url=None, region=None):
             if input_url is None:
                 def check(message):
                     return message.author.id == ctx.author.id
@@ -146,8 +2470,17 @@ class SteamPriceBot(commands.Bot):
                 await ctx.channel.send(embed=msg, delete_after=10.0)
                 return
 
-            async with aiohttp.ClientSession() as session:
-                result = await self.fetch_steam(session, app_id, url_type, return_value=True)
+            cc = (region or self.region_for(ctx.guild)).lower()
+
+            if cc not in REGION_CURRENCIES:
+                await ctx.message.delete()
+                msg = Embed(title='제품 추가 오류',
+                            description=f'지원하지 않는 지역입니다. 사용 가능한 지역: {", ".join(REGION_CURRENCIES)}')
+                await ctx.channel.send(embed=msg, delete_after=10.0)
+                return
+
+            app_id = product_key(app_id, cc)
+            result = await self.fetch_steam(app_id, url_type, return_value=True)
 
             if result:
                 await ctx.message.delete()
@@ -159,13 +2492,8 @@ class SteamPriceBot(commands.Bot):
                 await ctx.channel.send(embed=msg, delete_after=10.0)
                 return
 
-            if app_id not in self.id_dict:
-                self.id_dict[app_id] = {'user_id': ctx.author.id,
-                                        'guild': ctx.guild.id,
-                                        'channel': ctx.channel.id,
-                                        'type': url_type}
-                self.item_dict[app_id] = {}
-                self.save_id_dict()
+            if ctx.author.id not in self.subscribers.get(app_id, {}).get(ctx.channel.id, ()):
+                self.add_item(app_id, url_type, ctx.author.id, ctx.guild.id, ctx.channel.id)
 
                 msg = Embed(title='제품 추가됨',
                             description=f'[{name}]({input_url})이(가) 추가되었습니다.\n현재 가격: {price}')
@@ -177,6 +2505,96 @@ class SteamPriceBot(commands.Bot):
 
             return
 
+        @self.command(name='import')
+        async def import_(ctx, *args):
+            text = ' '.join(args)
+
+            # 첨부 파일은 메시지를 지우기 전에 읽음
+            for attachment in ctx.message.attachments:
+                if attachment.size <= 2 ** 20:
+                    text += '\n' + (await attachment.read()).decode('utf-8', 'replace')
+
+            await ctx.message.delete()
+
+            products = self.parse_urls(text)
+            wishlists = list(OrderedDict.fromkeys(WISHLIST_URL_PATTERN.findall(text)))
+
+            if not products and not wishlists:
+                msg = Embed(title='제품 가져오기',
+                            description='사용법: .import [상점 URL 목록 또는 찜 목록 URL]\nURL 목록을 텍스트 파일로 첨부해도 됩니다.')
+                await ctx.channel.send(embed=msg, delete_after=15.0)
+                return
+
+            progress = await ctx.channel.send(embed=Embed(title='제품 가져오기',
+                                                          description='제품을 확인하는 중입니다...'))
+            failed_wishlists = 0
+
+            for kind, name in wishlists:
+                try:
+                    items = await self.fetch_wishlist(kind, name)
+                except Exception:
+                    print(traceback.format_exc())
+                    items = None
+
+                if items is None:
+                    failed_wishlists += 1
+                else:
+                    products += items
+
+            cc = self.region_for(ctx.guild)
+            products = list(OrderedDict.fromkeys(products))
+            new = [(app_id, url_type) for app_id, url_type in products
+                   if ctx.author.id not in self.subscribers.get(product_key(app_id, cc), {}).get(ctx.channel.id, ())]
+            skipped = len(products) - len(new)
+            products = new
+            over = max(0, len(products) - IMPORT_LIMIT)
+            products = products[:IMPORT_LIMIT]
+
+            # 다른 사용자가 이미 추가한 제품은 다시 확인하지 않음
+            valid = await self.validate_products([(app_id, url_type) for app_id, url_type in products
+                                                  if product_key(app_id, cc) not in self.id_dict], cc)
+            added = []
+            invalid = 0
+
+            for app_id, url_type in products:
+                key = product_key(app_id, cc)
+
+                if key in self.id_dict:
+                    added.append((key, self.id_dict[key]['type'], None))
+                elif key in valid:
+                    added.append((key, url_type, valid[key]))
+                else:
+                    invalid += 1
+
+            if added:
+                self.add_items(added, ctx.author.id, ctx.guild.id, ctx.channel.id)
+
+            content = [f'추가한 제품: {len(added)}개']
+
+            if skipped:
+                content.append(f'이미 추가된 제품: {skipped}개')
+
+            if invalid:
+                content.append(f'추가하지 못한 제품: {invalid}개 (올바르지 않은 URL이거나 현재 판매하지 않는 제품)')
+
+            if over:
+                content.append(f'한 번에 추가할 수 있는 제품 수({IMPORT_LIMIT}개)를 넘은 제품: {over}개')
+
+            if failed_wishlists:
+                content.append(f'불러오지 못한 찜 목록: {failed_wishlists}개 (비공개이거나 없는 프로필)')
+
+            names = [self.item_name(key) for key, _, _ in added]
+
+            if names:
+                content.append('\n' + '\n'.join(names[:20]))
+
+                if len(names) > 20:
+                    content.append(f'외 {len(names) - 20}개')
+
+            msg = Embed(title='제품 가져오기 완료',
+                        description='\n'.join(content)[:4096])
+            await progress.edit(embed=msg, delete_after=30.0)
+
         @self.command()
         async def search(ctx, *query):
 
@@ -213,28 +2631,33 @@ class SteamPriceBot(commands.Bot):
 
             await ctx.message.delete()
 
-            async with aiohttp.ClientSession() as session:
-                async with session.get(f'https://store.steampowered.com/search/?term={" ".join(query)}') as r:
-                    soup = BeautifulSoup(await r.read(), 'html.parser')
+            cc = self.region_for(ctx.guild)
+            found = self.catalog.search(' '.join(query))
+
+            if found:  # 로컬 목록에서 찾은 경우 현재 가격만 스팀에서 불러옴
+                prices = await self.fetch_price_labels([app_id for app_id, _ in found], cc)
+                results = [(name, f'https://store.steampowered.com/app/{app_id}', prices.get(app_id, '가격 없음')) for app_id, name in found]
+            else:
+                r = await self.scheduler.get(f'{STORE_URL}/search/?term={" ".join(query)}&cc={cc}&l={STORE_LANGUAGE}')
+                results = await self.parse(parse_search_page, r.body)
 
-            names = [str(re.sub('<[^<>]*>', '', str(name))) for name in soup.select('div.responsive_search_name_combined > div.col.search_name.ellipsis > span')]
-            urls = [str(url['href']) for url in soup.select('#search_resultsRows > a')]
-            prices = [str(re.sub('<[^<>]*>', '', str(price))).strip() for price in soup.find_all('div', class_='col search_price responsive_secondrow')]
+                # GetAppList에는 영어 이름만 있으므로 검색 페이지에서 받은 한국어 이름을 목록에 더해 다음 검색은 로컬에서 찾음
+                for name, url, _ in results:
+                    match = PRODUCT_URL_PATTERN.match(url)
 
-            for i, price in enumerate(prices):
-                if not price:
-                    prices[i] = '가격 없음'
+                    if match and match.group(1) == 'app':
+                        self.catalog.add_local_name(int(match.group(2)), name)
 
-            if len(names) > 10:
+            if len(results) > 10:
                 max_index = 10
             else:
-                max_index = len(names)
+                max_index = len(results)
 
             embed_desc = [f"추가할 제품의 번호를 입력하세요. [1-{str(max_index)}]\n취소하려면 '취소'라고 입력하세요.\n"]
 
-            for i, name in enumerate(names):
+            for i, (name, _, price) in enumerate(results):
                 if i < 10:
-                    embed_desc.append(f'{str(i + 1)}. {name} - {prices[i]}')
+                    embed_desc.append(f'{str(i + 1)}. {name} - {price}')
                 else:
                     break
 
@@ -274,18 +2697,12 @@ class SteamPriceBot(commands.Bot):
                 index = int(message.content) - 1
                 await message.delete()
 
-            name = names[index]
-            price = prices[index]
-            app_url = urls[index]
+            name, app_url, price = results[index]
             app_id, url_type = self.parse_url(app_url)
+            app_id = product_key(app_id, cc)
 
-            if app_id not in self.id_dict:
-                self.id_dict[app_id] = {'user_id': ctx.author.id,
-                                        'guild': ctx.guild.id,
-                                        'channel': ctx.channel.id,
-                                        'type': url_type}
-                self.item_dict[app_id] = {}
-                self.save_id_dict()
+            if ctx.author.id not in self.subscribers.get(app_id, {}).get(ctx.channel.id, ()):
+                self.add_item(app_id, url_type, ctx.author.id, ctx.guild.id, ctx.channel.id)
 
                 msg = Embed(title='제품 추가됨',
                             description=f'[{name}]({app_url})이(가) 추가되었습니다.\n현재 가격: {price}')
@@ -301,22 +2718,19 @@ class SteamPriceBot(commands.Bot):
 
         @self.command()
         async def remove(ctx):
-            if not self.id_dict:
+            remove_list = self.storage.products_by_user(ctx.author.id)
+
+            if not remove_list:
                 await ctx.message.delete()
                 await ctx.channel.send('추가된 제품이 없습니다.', delete_after=10.0)
                 return
 
-            await self.update_dict()
+            await self.refresh_items(remove_list)
 
             message_to_send = ["제거할 제품의 번호를 입력하세요. (예시: 1)\n여러 제품을 제거하려면 다음과 같이 입력하세요: '1/2/3'\n취소하려면 '취소'라고 입력하세요.\n"]
-            remove_list = []
-            index = 0
 
-            for key, value in self.item_dict.items():
-                if self.id_dict[key]['user_id'] == ctx.author.id:
-                    message_to_send.append(f"{str(index + 1)}: {value['name']}")
-                    remove_list.append(key)
-                    index += 1
+            for index, key in enumerate(remove_list):
+                message_to_send.append(f"{str(index + 1)}: {self.item_name(key)}")
 
             prompt = await ctx.channel.send('\n'.join(message_to_send))
 
@@ -327,12 +2741,12 @@ class SteamPriceBot(commands.Bot):
 
                     elif len(message.content.split('/')) > 1 and message.author.id == ctx.author.id:
                         for number in message.content.split('/'):
-                            if not 1 <= int(number) <= len(self.id_dict):
+                            if not 1 <= int(number) <= len(remove_list):
                                 raise ValueError
                         return True
 
                     else:
-                        return message.author.id == ctx.author.id and 1 <= int(message.content) <= len(self.id_dict)
+                        return message.author.id == ctx.author.id and 1 <= int(message.content) <= len(remove_list)
                 except ValueError:
                     pass
 
@@ -359,10 +2773,9 @@ class SteamPriceBot(commands.Bot):
                 for number in message.content.split('/'):
                     remove_index = int(number) - 1
                     remove_url = remove_list[remove_index]
-                    removed_item = self.item_dict[remove_url]['name']
+                    removed_item = self.item_name(remove_url)
 
-                    del self.item_dict[remove_url]
-                    del self.id_dict[remove_url]
+                    self.remove_subscription(remove_url, ctx.author.id)
                     deleted_games.append(removed_item)
 
                 msg = Embed(title='다음 제품 제거됨',
@@ -376,17 +2789,15 @@ class SteamPriceBot(commands.Bot):
                 await message.delete()
                 remove_index = int(message.content) - 1
                 remove_url = remove_list[remove_index]
-                removed_item = self.item_dict[remove_url]['name']
+                removed_item = self.item_name(remove_url)
 
-                del self.item_dict[remove_url]
-                del self.id_dict[remove_url]
+                self.remove_subscription(remove_url, ctx.author.id)
 
                 msg = Embed(title='제품 제거됨',
                             description=f'{removed_item}을(를) 제거했습니다.')
 
                 await ctx.send(embed=msg, delete_after=15.0)
 
-            self.save_id_dict()
             return
 
         @self.command()
@@ -401,14 +2812,14 @@ class SteamPriceBot(commands.Bot):
                 await ctx.channel.send('추가된 제품이 없습니다.')
                 return
 
-            await self.update_dict()
+            await self.refresh_items(list(self.id_dict))
 
             message_to_send = ["제거할 제품의 번호를 입력하세요. (예시: 1)\n여러 제품을 제거하려면 다음과 같이 입력하세요: '1/2/3'\n취소하려면 '취소'라고 입력하세요.\n"]
             remove_list = []
             index = 0
 
             for key, value in self.item_dict.items():
-                message_to_send.append(f"{str(index + 1)}: {value['name']}")
+                message_to_send.append(f"{str(index + 1)}: {self.item_name(key)}")
                 remove_list.append(key)
                 index += 1
 
@@ -453,10 +2864,9 @@ class SteamPriceBot(commands.Bot):
                 for number in message.content.split('/'):
                     remove_index = int(number) - 1
                     remove_url = remove_list[remove_index]
-                    removed_item = self.item_dict[remove_url]['name']
+                    removed_item = self.item_name(remove_url)
 
-                    del self.item_dict[remove_url]
-                    del self.id_dict[remove_url]
+                    self.remove_item(remove_url)
                     deleted_games.append(removed_item)
 
                 msg = Embed(title='다음 제품 제거됨',
@@ -470,38 +2880,35 @@ class SteamPriceBot(commands.Bot):
                 await message.delete()
                 remove_index = int(message.content) - 1
                 remove_url = remove_list[remove_index]
-                removed_item = self.item_dict[remove_url]['name']
+                removed_item = self.item_name(remove_url)
 
-                del self.item_dict[remove_url]
-                del self.id_dict[remove_url]
+                self.remove_item(remove_url)
 
                 msg = Embed(title='제품 제거됨',
                             description=f'{removed_item}을(를) 제거했습니다.')
 
                 await ctx.send(embed=msg, delete_after=15.0)
 
-            self.save_id_dict()
             return
 
         @self.command(name='list')
         async def list_(ctx):
             author = await self.fetch_user(ctx.author.id)
-            game_list = []
-
-            for key, value in self.id_dict.items():
-                if value['user_id'] == ctx.author.id and ctx.guild == self.get_guild(value['guild']):
-                    game_list.append(key)
+            game_list = self.storage.products_by_user(ctx.author.id, ctx.guild.id)
 
             if game_list:
-                await self.update_dict()
+                await self.refresh_items(game_list)
                 content = []
 
-                for key, value in self.item_dict.items():
-                    if self.id_dict[key]['user_id'] == ctx.author.id and self.get_guild(self.id_dict[key]['guild']) == ctx.guild:
-                        if value['on_sale']:
-                            content.append(f'[{value["name"]}](https://store.steampowered.com/{self.id_dict[key]["type"]}/{key}) - {value["final_formatted"]} ({value["discount_perc"]}% 할인)')
-                        else:
-                            content.append(f'[{value["name"]}](https://store.steampowered.com/{self.id_dict[key]["type"]}/{key}) - {value["final_formatted"]}')
+                for key in game_list:
+                    value = self.item_dict[key]
+
+                    if value is None:  # 가격을 불러오지 못한 제품
+                        content.append(f'[{self.item_name(key)}]({self.store_url(key)}) - 가격 정보 없음')
+                    elif value.on_sale:
+                        content.append(f'[{self.item_name(key)}]({self.store_url(key)}) - {value.final_formatted} ({value.discount_perc}% 할인)')
+                    else:
+                        content.append(f'[{self.item_name(key)}]({self.store_url(key)}) - {value.final_formatted}')
 
                 await ctx.message.delete()
                 msg = Embed(title=f'{str(author).split("#")[0]}님은 현재 {str(len(game_list))} 개의 제품이 추가되어 있습니다.',
@@ -522,19 +2929,24 @@ class SteamPriceBot(commands.Bot):
                 await ctx.channel.send('알림: 소유자만 이 명령어를 사용할 수 있습니다.', delete_after=5.0)
                 return
 
-            if self.id_dict:
-                await self.update_dict()
+            channel_list = self.storage.products_by_channel(ctx.channel.id)
+
+            if channel_list:
+                await self.refresh_items(channel_list)
                 content = []
 
-                for key, value in self.item_dict.items():
-                    if self.get_channel(self.id_dict[key]['guild']) == ctx.guild:
-                        if value['on_sale']:
-                            content.append(f'[{value["name"]}](https://store.steampowered.com/{self.id_dict[key]["type"]}/{key}) - {value["final_formatted"]} ({value["discount_perc"]}% 할인)')
-                        else:
-                            content.append(f'[{value["name"]}](https://store.steampowered.com/{self.id_dict[key]["type"]}/{key}) - {value["final_formatted"]}')
+                for key in channel_list:
+                    value = self.item_dict[key]
+
+                    if value is None:  # 가격을 불러오지 못한 제품
+                        content.append(f'[{self.item_name(key)}]({self.store_url(key)}) - 가격 정보 없음')
+                    elif value.on_sale:
+                        content.append(f'[{self.item_name(key)}]({self.store_url(key)}) - {value.final_formatted} ({value.discount_perc}% 할인)')
+                    else:
+                        content.append(f'[{self.item_name(key)}]({self.store_url(key)}) - {value.final_formatted}')
 
                 await ctx.message.delete()
-                msg = Embed(title=f'현재 채널에 {str(len(self.id_dict))} 개의 제품이 추가되어 있습니다.',
+                msg = Embed(title=f'현재 채널에 {str(len(channel_list))} 개의 제품이 추가되어 있습니다.',
                             description='\n'.join(content))
 
                 await ctx.channel.send(embed=msg, delete_after=30.0)
@@ -545,153 +2957,489 @@ class SteamPriceBot(commands.Bot):
                             description='추가된 제품이 없습니다.')
                 await ctx.channel.send(embed=msg, delete_after=10.0)
 
-    async def update_dict(self):
-        async with aiohttp.ClientSession() as session:
-            await asyncio.gather(*[self.fetch_steam(session, key, value['type']) for key, value in self.id_dict.items()])
+        @self.command()
+        async def history(ctx, query=None, region=None):
+            await ctx.message.delete()
 
-    async def fetch_bundle(self, session, app_id):
-        async with session.get(f'https://store.steampowered.com/bundle/{app_id}') as r:
-            session_id = r.cookies.get('sessionid').value
+            if query is None:
+                await ctx.channel.send('사용법: .history [상점 URL 또는 ID] (지역)', delete_after=10.0)
+                return
 
-        await session.post(f'https://store.steampowered.com/agecheckset/bundle/{app_id}/', data={'sessionid': session_id, 'ageDay': '1', 'ageMonth': 'January', 'ageYear': '1990'})
+            cc = (region or self.region_for(ctx.guild)).lower()
 
-        async with session.get(f'https://store.steampowered.com/bundle/{app_id}#') as r:
-            content = await r.read()
+            if cc not in REGION_CURRENCIES:
+                msg = Embed(title='가격 기록 오류',
+                            description=f'지원하지 않는 지역입니다. 사용 가능한 지역: {", ".join(REGION_CURRENCIES)}')
+                await ctx.channel.send(embed=msg, delete_after=10.0)
+                return
 
-        soup = BeautifulSoup(content, 'html.parser')
-        name = str(re.sub('<[^<>]*>', '', str(soup.find('h2', class_='pageheader'))))
-        discount_perc = str(re.sub('<[^<>0-9]*>', '', str(soup.find('div', class_='discount_pct'))))
-        initial_formatted = str(re.sub('<[^<>]*>', '', str(soup.find('div', class_='discount_original_price'))))
-        final_formatted = str(re.sub('<[^<>]*>', '', str(soup.find('div', class_='discount_final_price'))))
+            if query.isdigit():
+                app_id = query
+                url_type = self.id_dict.get(product_key(app_id, cc), {}).get('type', 'app')
+            else:
+                app_id, url_type = self.parse_url(query)
 
-        if discount_perc == 'None':
-            on_sale = False
-            discount_perc = ''
-        else:
-            on_sale = True
+            if not app_id:
+                msg = Embed(title='가격 기록 오류',
+                            description='올바른 Steam 상점 URL이 아닙니다.')
+                await ctx.channel.send(embed=msg, delete_after=10.0)
+                return
 
-        initial = re.sub('[^0-9]', '', initial_formatted)
-        final = re.sub('[^0-9]', '', final_formatted)
+            kind = PRODUCT_KINDS[url_type]
+            currency = REGION_CURRENCIES[cc]
+            changes = self.storage.price_history(kind, int(app_id), cc)
 
-        return name, initial, initial_formatted, final, final_formatted, on_sale, discount_perc
+            if not changes:
+                msg = Embed(title='알림',
+                            description='가격 기록이 없는 제품입니다.')
+                await ctx.channel.send(embed=msg, delete_after=10.0)
+                return
 
-    async def fetch_steam(self, session, app_id, url_type, return_value=False):
-        try:
-            if url_type == 'bundle':
-                name, initial, initial_formatted, final, final_formatted, on_sale, discount_perc = await self.fetch_bundle(session, app_id)
+            lowest, lowest_at = self.storage.lowest_price(kind, int(app_id), cc)
+            last_sale = self.storage.last_sale(kind, int(app_id), cc)
+            content = [f'역대 최저가: {format_price(lowest, currency)} ({format_date(lowest_at)})']
 
+            if last_sale:
+                content.append(f'마지막 할인: {format_date(last_sale[2])} (-{last_sale[1]}%)')
             else:
-                if url_type == 'sub':
-                    url_type = 'package'
+                content.append('마지막 할인: 없음')
 
-                url = f'https://store.steampowered.com/api/{url_type}details?{url_type}ids={app_id}'
+            content.append('\n최근 가격 변동')
 
-                async with session.get(url) as r:
-                    content = await r.read()
+            for final, discount_perc, recorded_at in changes:
+                if discount_perc:
+                    content.append(f'{format_date(recorded_at)} - {format_price(final, currency)} ({discount_perc}% 할인)')
+                else:
+                    content.append(f'{format_date(recorded_at)} - {format_price(final, currency)}')
 
-                data = json.loads(content)[app_id]['data']
-                name = data['name']
+            msg = Embed(title=self.item_name(product_key(app_id, cc)),
+                        url=f'https://store.steampowered.com/{url_type}/{app_id}?cc={cc}',
+                        description='\n'.join(content))
+            await ctx.channel.send(embed=msg, delete_after=60.0)
 
-                if url_type == 'app':
-                    initial = str(data['price_overview']['initial'])[:-2]
-                    final = str(data['price_overview']['final'])[:-2]
+        @self.command()
+        async def alert(ctx, action=None, target=None, value=None):
+            await ctx.message.delete()
+            usage = ('.alert below [상점 URL 또는 ID] [가격]  -  가격이 해당 금액 이하로 내려가면 알립니다.\n'
+                     '.alert discount [상점 URL 또는 ID] [할인율]  -  할인율이 해당 값 이상이 되면 알립니다.\n'
+                     '.alert lowest [상점 URL 또는 ID]  -  역대 최저가를 갱신하면 알립니다.\n'
+                     '.alert list  -  설정한 알림 목록을 확인합니다.\n'
+                     '.alert remove [번호]  -  알림을 제거합니다.')
+
+            if action is None:
+                msg = Embed(title='가격 알림 도움말',
+                            description=usage)
+                await ctx.channel.send(embed=msg, delete_after=30.0)
+                return
 
-                    initial_formatted = data['price_overview']['initial_formatted']
-                    final_formatted = data['price_overview']['final_formatted']
-                    discount_perc = data['price_overview']['discount_percent']
+            rules = self.alerts.by_user(ctx.author.id)
 
-                elif url_type == 'package':
-                    initial = str(data['price']['initial'])[:-2]
-                    final = str(data['price']['final'])[:-2]
+            if action == 'list':
+                if not rules:
+                    await ctx.channel.send('설정한 알림이 없습니다.', delete_after=10.0)
+                    return
 
-                    initial_formatted = f'₩ {format(int(initial), ",d")}'
-                    final_formatted = f'₩ {format(int(final), ",d")}'
-                    discount_perc = data['price']['discount_percent']
+                content = [f'{index + 1}. {self.item_name(key)} - {self.describe_alert(key, kind, threshold)}'
+                           for index, (_, (key, _, _, kind, threshold)) in enumerate(rules)]
+                msg = Embed(title=f'{str(ctx.author).split("#")[0]}님의 가격 알림',
+                            description='\n'.join(content))
+                await ctx.channel.send(embed=msg, delete_after=30.0)
+                return
 
-                else:
+            if action == 'remove':
+                if target is None or not target.isdigit() or not 1 <= int(target) <= len(rules):
+                    await ctx.channel.send('사용법: .alert remove [번호] (번호는 .alert list 에서 확인)', delete_after=10.0)
                     return
 
-                if discount_perc:
-                    on_sale = True
-                else:
-                    on_sale = False
+                rule_id, (key, _, _, kind, threshold) = rules[int(target) - 1]
+                self.alerts.remove(rule_id)
+                self.storage.remove_alert(rule_id)
 
-        except Exception as e:
-            print(traceback.format_exc(e))
+                msg = Embed(title='알림 제거됨',
+                            description=f'{self.item_name(key)} - {self.describe_alert(key, kind, threshold)}')
+                await ctx.channel.send(embed=msg, delete_after=15.0)
+                return
 
-            if return_value:
-                return False
+            if action not in ('below', 'discount', 'lowest') or target is None or (action != 'lowest' and value is None):
+                msg = Embed(title='가격 알림 오류',
+                            description=usage)
+                await ctx.channel.send(embed=msg, delete_after=30.0)
+                return
+
+            cc = self.region_for(ctx.guild)
+
+            if target.isdigit():
+                app_id = target
+                url_type = self.id_dict.get(product_key(app_id, cc), {}).get('type', 'app')
             else:
-                await self.owner.send(f'다음 제품을 불러오는 도중 오류가 발생했습니다: {app_id}\n{e}')
+                app_id, url_type = self.parse_url(target)
+
+            if not app_id:
+                msg = Embed(title='가격 알림 오류',
+                            description='올바른 Steam 상점 URL이 아닙니다.')
+                await ctx.channel.send(embed=msg, delete_after=10.0)
                 return
 
-        if return_value:
-            return name, final_formatted
+            key = product_key(app_id, cc)
 
-        else:
-            self.item_dict[app_id]['name'] = name
-            self.item_dict[app_id]['initial'] = initial
-            self.item_dict[app_id]['initial_formatted'] = initial_formatted
-            self.item_dict[app_id]['final'] = final
-            self.item_dict[app_id]['final_formatted'] = final_formatted
-            self.item_dict[app_id]['on_sale'] = on_sale
-            self.item_dict[app_id]['discount_perc'] = discount_perc
+            if action == 'below':
+                amount = re.sub('[^0-9.]', '', value)
+
+                try:
+                    threshold = round(float(amount) * 100)  # 스팀 API와 같이 최소 단위의 100배로 저장
+                except ValueError:
+                    threshold = -1
+
+                if threshold < 0:
+                    await ctx.channel.send('알림: 가격은 숫자로 입력하세요. (예시: 10000)', delete_after=10.0)
+                    return
+
+            elif action == 'discount':
+                if not value.rstrip('%').isdigit() or not 1 <= int(value.rstrip('%')) <= 100:
+                    await ctx.channel.send('알림: 할인율은 1에서 100 사이의 숫자로 입력하세요.', delete_after=10.0)
+                    return
+
+                threshold = int(value.rstrip('%'))
+
+            else:
+                threshold = None
+
+            # 알림을 받으려면 제품이 추가되어 있어야 하므로 아직 추가하지 않았다면 함께 추가함
+            if ctx.author.id not in self.subscribers.get(key, {}).get(ctx.channel.id, ()):
+                if not await self.fetch_steam(key, url_type, return_value=True):
+                    msg = Embed(title='가격 알림 오류',
+                                description='오류: 올바르지 않은 URL이거나 현재 판매하지 않는 제품입니다.')
+                    await ctx.channel.send(embed=msg, delete_after=10.0)
+                    return
+
+                self.add_item(key, url_type, ctx.author.id, ctx.guild.id, ctx.channel.id)
+
+            rule_id = self.storage.add_alert(key, ctx.author.id, ctx.channel.id, action, threshold)
+            self.alerts.add(rule_id, key, ctx.author.id, ctx.channel.id, action, threshold)
+
+            if action == 'lowest' and key not in self.alerts.lowest_price:
+                self.load_lowest_price(key)
+
+            content = [f'{self.item_name(key)} - {self.describe_alert(key, action, threshold)}']
+            item = self.item_dict.get(key)
+
+            if item is not None and ((action == 'below' and item.final <= threshold) or (action == 'discount' and item.discount_perc >= threshold)):
+                content.append(f'\n현재 가격 {item.final_formatted}({item.discount_perc}% 할인)으로 이미 조건을 만족합니다.')
+
+            msg = Embed(title='알림 추가됨',
+                        description='\n'.join(content))
+            await ctx.channel.send(embed=msg, delete_after=15.0)
+
+        @self.command()
+        async def region(ctx, code=None):
+            await ctx.message.delete()
+            current = self.region_for(ctx.guild)
+
+            if code is None:
+                msg = Embed(title='상점 지역',
+                            description=f'현재 지역: {current} ({REGION_CURRENCIES[current]})\n사용 가능한 지역: {", ".join(REGION_CURRENCIES)}')
+                await ctx.channel.send(embed=msg, delete_after=15.0)
+                return
+
+            if ctx.guild is None:
+                await ctx.channel.send('알림: 서버 채널에서만 지역을 변경할 수 있습니다.', delete_after=5.0)
+                return
+
+            if ctx.author != self.owner and not ctx.author.guild_permissions.manage_guild:
+                await ctx.channel.send('알림: 서버 관리 권한이 있어야 지역을 변경할 수 있습니다.', delete_after=5.0)
+                return
+
+            code = code.lower()
+
+            if code not in REGION_CURRENCIES:
+                msg = Embed(title='상점 지역 오류',
+                            description=f'지원하지 않는 지역입니다. 사용 가능한 지역: {", ".join(REGION_CURRENCIES)}')
+                await ctx.channel.send(embed=msg, delete_after=10.0)
+                return
+
+            self.guild_regions[ctx.guild.id] = code
+            self.storage.set_guild_region(ctx.guild.id, code)
+
+            msg = Embed(title='상점 지역 변경됨',
+                        description=f'이 서버에서 새로 추가하는 제품은 {code} ({REGION_CURRENCIES[code]}) 상점 가격으로 확인합니다.')
+            await ctx.channel.send(embed=msg, delete_after=15.0)
+
+        @self.command()
+        async def stats(ctx):
+            await ctx.message.delete()
+
+            if ctx.author != self.owner:
+                await ctx.channel.send('알림: 소유자만 이 명령어를 사용할 수 있습니다.', delete_after=5.0)
+                return
+
+            self.update_gauges()
+            cycles = metrics.counter_values('steam_cycles_total')
+            content = [f'감시 중인 제품: {metrics.gauge("steam_watched_products")}개 (가격 정보 없음 {metrics.gauge("steam_unpriced_products")}개)',
+                       f'가격 확인 주기: 성공 {cycles.get((("result", "ok"),), 0)}회, 실패 {cycles.get((("result", "failed"),), 0)}회']
+
+            for _, (count, average, p95) in metrics.summary('steam_cycle_seconds').items():
+                content.append(f'주기 소요 시간: 마지막 {format_seconds(metrics.gauge("steam_last_cycle_seconds") or 0)}, 평균 {format_seconds(average)}, p95 {format_seconds(p95)}')
+
+            content.append('\n제품 유형별 요청 시간')
+
+            for labels, (count, average, p95) in sorted(metrics.summary('steam_fetch_seconds').items()):
+                labels = dict(labels)
+                content.append(f'{labels["type"]} ({labels["mode"]}) - {count}회, 평균 {format_seconds(average)}, p95 {format_seconds(p95)}')
+
+            content.append(f'\nHTTP 상태 코드: {format_counts(metrics.counter_values("steam_http_responses_total"))}')
+            content.append(f'재시도: {format_counts(metrics.counter_values("steam_http_retries_total"))}')
+            content.append(f'연결 오류: {format_counts(metrics.counter_values("steam_http_errors_total"))}')
+            content.append(f'파싱 실패: {format_counts(metrics.counter_values("steam_parse_failures_total"))}')
+            content.append(f'격리된 제품: {metrics.gauge("steam_quarantined_products")}개')
+            content.append(f'서킷 브레이커: {self.breaker_status()}')
+
+            for _, (count, average, p95) in metrics.summary('steam_event_loop_lag_seconds').items():
+                content.append(f'\n이벤트 루프 지연: 마지막 {format_seconds(metrics.gauge("steam_event_loop_lag_last_seconds") or 0)}, 평균 {format_seconds(average)}, p95 {format_seconds(p95)}')
+
+            msg = Embed(title='봇 상태',
+                        description='\n'.join(content))
+            await ctx.channel.send(embed=msg, delete_after=60.0)
+
+    async def fetch_price_labels(self, app_ids, cc):
+        try:
+            r = await self.scheduler.get(f'{STORE_URL}/api/appdetails?appids={",".join(app_ids)}&cc={cc}&filters=price_overview')
+            data = json.loads(r.body)
+
+        except Exception:
+            print(traceback.format_exc())
+            return {}
+
+        prices = {}
+
+        for app_id in app_ids:
+            try:
+                prices[app_id] = data[app_id]['data']['price_overview']['final_formatted']
+            except (KeyError, TypeError):  # 무료 제품은 price_overview가 없음
+                pass
+
+        return prices
+
+    async def refresh_catalog(self):
+        names = self.storage.load_catalog()
+
+        if names:
+            self.catalog.replace(names, await self.loop.run_in_executor(None, build_catalog_index, names))
+            print(f'Loaded {len(names)} apps into the search catalog.')
+
+        await asyncio.sleep(30)
+
+        while not self.is_closed():
+            try:
+                r = await self.scheduler.get(f'{API_URL}/ISteamApps/GetAppList/v2/')
+                apps = json.loads(r.body)['applist']['apps']
+                latest = {app['appid']: app['name'] for app in apps if app['name']}
+
+                added = {appid: name for appid, name in latest.items() if self.catalog.names.get(appid) != name}
+                removed = [appid for appid in self.catalog.names if appid not in latest]
+
+                if not self.catalog.names:
+                    self.catalog.replace(latest, await self.loop.run_in_executor(None, build_catalog_index, latest))
+                else:
+                    self.catalog.update(added, removed)
+
+                self.storage.update_catalog(added, removed)
+                print(f'Search catalog refreshed. ({len(added)} added or renamed, {len(removed)} removed)')
+
+            except Exception:
+                print(traceback.format_exc())
+
+            await asyncio.sleep(CATALOG_REFRESH)
+
+    async def start(self, *args, **kwargs):
+        await self.open_session()
+        await self.start_metrics_server()
+
+        if self.coordinator is not None:
+            await self.coordinator.start()
+
+        await super().start(*args, **kwargs)
+
+    async def start_metrics_server(self):
+        if not METRICS_PORT:
+            return
+
+        app = web.Application()
+        app.router.add_get('/metrics', self.serve_metrics)
+        self.metrics_runner = web.AppRunner(app)
+        await self.metrics_runner.setup()
+
+        try:
+            await web.TCPSite(self.metrics_runner, METRICS_HOST, METRICS_PORT).start()
+            print(f'Serving metrics on http://{METRICS_HOST}:{METRICS_PORT}/metrics')
+
+        except OSError as e:  # 포트를 열 수 없어도 봇은 계속 실행
+            print(f'Could not start metrics server: {e}')
+
+    def update_gauges(self):
+        metrics.set('steam_watched_products', len(self.id_dict))
+        metrics.set('steam_unpriced_products', sum(1 for item in self.item_dict.values() if item is None))
+        metrics.set('steam_subscriptions', sum(len(user_ids) for channels in self.subscribers.values() for user_ids in channels.values()))
+        metrics.set('steam_inflight_requests', len(self.inflight))
+        metrics.set('steam_scheduled_products', len(self.poller.due))
+        metrics.set('steam_pending_notifications', sum(queue.qsize() for queue in self.dispatcher.queues.values()))
+        metrics.set('steam_quarantined_products', len(self.failures))
+        metrics.set('steam_circuit_breaker_open', int(self.scheduler.breaker.is_open()))
+
+    async def serve_metrics(self, request):
+        self.update_gauges()
+        return web.Response(text=metrics.render(), content_type='text/plain', headers={'Cache-Control': 'no-store'})
+
+    async def monitor_loop(self):
+        # 1초 간격으로 잠들었다 깨어난 시간을 재서 이벤트 루프가 막힌 정도를 측정
+        while not self.is_closed():
+            start = time.monotonic()
+            await asyncio.sleep(1)
+            lag = max(0.0, time.monotonic() - start - 1)
+            metrics.observe('steam_event_loop_lag_seconds', lag)
+            metrics.set('steam_event_loop_lag_last_seconds', lag)
+
+    def breaker_status(self):
+        breaker = self.scheduler.breaker
+
+        if breaker.is_open():
+            return f'열림 ({int(breaker.opened_until - time.monotonic())}초 후 다시 시도)'
+
+        return '닫힘'
+
+    async def send_error_digest(self):
+        # 오류마다 메시지를 보내지 않고 일정 시간마다 모아서 한 번만 보냄
+        reported_trips = 0
+
+        while not self.is_closed():
+            await asyncio.sleep(ERROR_DIGEST_INTERVAL)
+            entries = self.take_errors()
+            trips = self.scheduler.breaker.trips - reported_trips
+            reported_trips += trips
+
+            if not entries and not trips:
+                continue
+
+            content = [f'지난 {ERROR_DIGEST_INTERVAL // 60}분 동안 {sum(entry[2] for entry in entries)}건의 오류가 발생했습니다.']
+
+            for url_type, summary, count, ids in entries[:10]:
+                content.append(f'{url_type} - {summary} ({count}회, 예: {", ".join(ids)})')
+
+            if len(entries) > 10:
+                content.append(f'외 {len(entries) - 10}가지 오류')
+
+            content.append(f'\n격리된 제품: {len(self.failures)}개')
+            content.append(f'서킷 브레이커: {self.breaker_status()}, 이번 기간 {trips}회 작동')
+
+            try:
+                await self.report_to_owner('\n'.join(content)[:2000])  # 디스코드 메시지 길이 제한
+            except Exception:
+                print(traceback.format_exc())
+
+    async def close(self):
+        self.dispatcher.close()
+        await super().close()
+
+        if self.metrics_runner is not None:
+            await self.metrics_runner.cleanup()
+
+        if self.coordinator is not None:
+            await self.coordinator.close()
+
+        if self.session is not None:
+            await self.session.close()
+
+        self.parse_executor.shutdown(wait=False)
+        self.save_prices()  # 다음 실행 때 불러올 수 있도록 마지막 가격을 저장
+        self.storage.close()
 
     async def on_ready(self):
         print(f'Logged in as {self.user.name} | {self.user.id}')
         self.owner_id = OWNER_USER_ID
         self.owner = self.get_user(self.owner_id)
         await self.change_presence(activity=Activity(type=ActivityType.watching, name=".help | Steam"))
-        await self.update_dict()
+
+        # 저장된 가격으로 바로 응답하고 오래됐거나 없는 가격만 백그라운드에서 불러옴
+        task = self.loop.create_task(self.refresh_items(list(self.id_dict)))
+        self.refresh_tasks.add(task)
+        task.add_done_callback(self.refresh_tasks.discard)
+
+    def notify_changes(self, changes):
+        # 조건을 넘은 알림 규칙: 제품 키 -> 채널 -> [(user_id, 조건)]
+        alerts = {}
+
+        for (key, user_id, channel, kind, threshold), change in self.alerts.evaluate(changes):
+            alerts.setdefault(key, {}).setdefault(channel, []).append((user_id, self.describe_alert(key, kind, threshold)))
+
+        metrics.inc('steam_alerts_total', sum(len(reasons) for channels in alerts.values() for reasons in channels.values()))
+
+        # 알림은 채널별 큐로 넘기고 가격 확인은 전송을 기다리지 않음
+        for change in changes:
+            info = self.id_dict.get(change.app_id)
+
+            if info is None:  # 가격을 불러오는 사이에 제거된 제품
+                continue
+
+            store_url = self.store_url(change.app_id)
+            subscribers = self.subscribers.get(change.app_id, {})
+            fired = alerts.get(change.app_id, {})
+
+            for channel_id in set(subscribers) | set(fired):
+                user_ids = set(subscribers.get(channel_id, ()))
+                reasons = []
+
+                for user_id, reason in fired.get(channel_id, ()):
+                    user_ids.add(user_id)
+                    reasons.append(f'<@{user_id}> 알림 조건 도달: {reason}')
+
+                self.dispatcher.submit(channel_id, user_ids, change, store_url, reasons)
+
+    async def send_notification(self, channel_id, content, embed):
+        await self.get_channel(channel_id).send(content, embed=embed)
 
     async def check_price(self):
         await asyncio.sleep(5)
+        self.poller.spread(list(self.id_dict))
 
         while not self.is_closed():
-            print('Starting price check...')
             try:
-                last_dict = self.item_dict
-                await self.update_dict()
-
-                for key, value in self.item_dict.items():
-                    try:
-                        if value['final'] != last_dict[key]['final']:
-                            store_url = ''
-
-                            if self.id_dict[key]['type'] == 'app':
-                                store_url = f'https://store.steampowered.com/app/{key}'
-
-                            elif self.id_dict[key]['type'] == 'package':
-                                store_url = f'https://store.steampowered.com/sub/{key}'
-
-                            elif self.id_dict[key]['type'] == 'bundle':
-                                store_url = f'https://store.steampowered.com/bundle/{key}'
-
-                            if value['on_sale']:
-                                msg = Embed(title=value['name'],
-                                            url=store_url,
-                                            description=f'{value["name"]}이(가) 할인 중입니다! \n\n{last_dict[key]["final_formatted"]} -> {value["final_formatted"]} (-{value["discount_perc"]}%')
-                            else:
-                                msg = Embed(title=value['name'],
-                                            url=store_url,
-                                            description=f'{value["name"]}의 가격이 변경되었습니다. \n\n{last_dict[key]["final_formatted"]} -> {value["final_formatted"]}')
-
-                            if value['on_sale']:
-                                await self.get_channel(self.id_dict[key]['channel']).send(f'<@{self.id_dict[key]["user_id"]}>', embed=msg)
-                            else:
-                                await self.get_channel(self.id_dict[key]['channel']).send(f'<@{self.id_dict[key]["user_id"]}>', embed=msg)
-
-                    except KeyError:
-                        print(traceback.format_exc())
-                        pass
+                # POLL_TICK 동안 예정된 제품을 모아서 한 번에 묶어 요청함
+                await asyncio.sleep(POLL_TICK)
+
+                if self.scheduler.breaker.is_open():  # 스팀 오류가 잦으면 예정된 확인을 미룸
+                    continue
+
+                due = [app_id for app_id in self.poller.pop_due() if app_id in self.id_dict]
+
+                if self.coordinator is not None:  # 워커가 맡은 제품은 워커에서 확인함
+                    due = [app_id for app_id in due if self.coordinator.owner(app_id) is None]
 
-                print('Price check ended successfully.')
-                await asyncio.sleep(INTERVAL)
+                if not due:
+                    if self.dirty_prices or self.checked_prices:  # 명령어로 불러온 가격도 주기적으로 저장함
+                        self.save_prices()
+
+                    continue
+
+                changes = await self.run_cycle(due)
+                self.notify_changes(changes)
+                self.save_prices()
 
             except Exception as e:
+                metrics.inc('steam_cycles_total', result='failed')
                 print(f'Price check failed with exception {e}')
                 await asyncio.sleep(5)
 
 
-bot = SteamPriceBot()
-bot.run(TOKEN)
+if __name__ == '__main__':  # 프로세스 풀 사용 시 하위 프로세스에서 봇이 다시 실행되지 않도록 함
+    if len(sys.argv) == 3 and sys.argv[1] == '--worker':  # python steam.py --worker 호스트:포트
+        worker = PriceWorker(sys.argv[2])
+
+        try:
+            worker.loop.run_until_complete(worker.run())
+        except KeyboardInterrupt:
+            pass
+        finally:
+            worker.loop.run_until_complete(worker.close())
+
+    else:
+        bot = SteamPriceBot()
+        bot.run(TOKEN)
@@ -0,0 +1,18 @@
+import os
+import sys
+import json
+import tempfile
+
+# steam.py는 불러올 때 현재 폴더의 config.json을 읽으므로 임시 폴더에 테스트용 설정을 만들어 둠
+TEST_DIR = tempfile.mkdtemp(prefix='steam-test-')
+
+with open(os.path.join(TEST_DIR, 'config.json'), 'w') as f:
+    f.write(json.dumps({'bot_token': '',
+                        'owner_user_id': '0',
+                        'test_mode': True,
+                        'interval': 60,
+                        'metrics_port': 0,
+                        'database': os.path.join(TEST_DIR, 'test.db')}, indent=4))
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.chdir(TEST_DIR)
@@ -0,0 +1,474 @@
+import os
+import json
+import types
+import asyncio
+
+import pytest
+
+import steam
+
+FIXTURES_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'fixtures')
+
+
+def fixture(name):
+    with open(os.path.join(FIXTURES_DIR, name), 'rb') as f:
+        return f.read()
+
+
+def record(final, discount_perc=0):
+    return steam.PriceRecord('Portal 2', final, f'₩ {final // 100:,d}', final, f'₩ {final // 100:,d}', bool(discount_perc), discount_perc)
+
+
+def change(key, old, new):
+    return steam.PriceChange(key, 'Portal 2', old, new)
+
+
+def test_hash_ring_empty():
+    assert steam.HashRing().owner('620:kr') is None
+
+
+def test_hash_ring_spreads_keys():
+    ring = steam.HashRing()
+
+    for node in ('worker-1', 'worker-2', 'worker-3'):
+        ring.add(node)
+
+    owners = [ring.owner(f'{i}:kr') for i in range(3000)]
+
+    for node in ('worker-1', 'worker-2', 'worker-3'):
+        assert owners.count(node) > 600
+
+
+def test_hash_ring_remove_moves_only_removed_keys():
+    ring = steam.HashRing()
+
+    for node in ('worker-1', 'worker-2', 'worker-3'):
+        ring.add(node)
+
+    before = {key: ring.owner(key) for key in (f'{i}:kr' for i in range(1000))}
+    ring.remove('worker-2')
+
+    for key, owner in before.items():
+        if owner == 'worker-2':
+            assert ring.owner(key) in ('worker-1', 'worker-3')
+        else:
+            assert ring.owner(key) == owner
+
+    assert 'worker-2' not in ring.nodes.values()
+    assert len(ring.points) == len(ring.nodes)
+
+
+def test_hash_ring_readd_restores_owners():
+    ring = steam.HashRing()
+    ring.add('worker-1')
+    ring.add('worker-2')
+    before = {key: ring.owner(key) for key in (f'{i}:kr' for i in range(500))}
+
+    ring.remove('worker-2')
+    ring.add('worker-2')
+
+    assert {key: ring.owner(key) for key in before} == before
+
+
+class MessageWriter:
+    def __init__(self):
+        self.messages = []
+
+    def write(self, data):
+        self.messages.append(json.loads(data))
+
+
+def test_coordinator_shares_request_rate(monkeypatch):
+    monkeypatch.setattr(steam, 'REQUESTS_PER_SECOND', 12)
+    limiter = steam.RateLimiter(12)
+    bot = types.SimpleNamespace(scheduler=types.SimpleNamespace(limiter=limiter), id_dict={}, item_dict={})
+    coordinator = steam.Coordinator(bot)
+    writers = {}
+
+    for name in ('worker-1', 'worker-2'):
+        writers[name] = coordinator.workers[name] = MessageWriter()
+        coordinator.rebalance(lambda: coordinator.ring.add(name))
+
+    assert limiter.rate == 4
+    assert writers['worker-1'].messages == [{'op': 'rate', 'requests_per_second': 6}, {'op': 'rate', 'requests_per_second': 4}]
+    assert writers['worker-2'].messages == [{'op': 'rate', 'requests_per_second': 4}]
+
+    del coordinator.workers['worker-2']
+    coordinator.rebalance(lambda: coordinator.ring.remove('worker-2'))
+
+    assert limiter.rate == 6
+    assert writers['worker-1'].messages[-1] == {'op': 'rate', 'requests_per_second': 6}
+
+
+def test_alert_below_fires_only_crossed_thresholds():
+    rules = steam.AlertRules()
+    rules.add(1, '620:kr', 10, 100, 'below', 1000000)
+    rules.add(2, '620:kr', 10, 100, 'below', 2000000)
+    rules.add(3, '620:kr', 11, 100, 'below', 3000000)
+
+    fired = rules.evaluate([change('620:kr', record(2500000), record(1500000))])
+    assert [rule[4] for rule, _ in fired] == [2000000]
+
+    # 새 가격이 기준값과 같으면 알림, 이전 가격이 기준값과 같으면 이미 넘은 것이므로 알리지 않음
+    fired = rules.evaluate([change('620:kr', record(1500000), record(1000000))])
+    assert [rule[4] for rule, _ in fired] == [1000000]
+
+    fired = rules.evaluate([change('620:kr', record(1000000), record(500000))])
+    assert fired == []
+
+
+def test_alert_below_ignores_price_increase_and_other_products():
+    rules = steam.AlertRules()
+    rules.add(1, '620:kr', 10, 100, 'below', 2000000)
+
+    assert rules.evaluate([change('620:kr', record(1500000), record(2500000))]) == []
+    assert rules.evaluate([change('400:kr', record(2500000), record(1500000))]) == []
+
+
+def test_alert_discount_range():
+    rules = steam.AlertRules()
+    rules.add(1, '620:kr', 10, 100, 'discount', 10)
+    rules.add(2, '620:kr', 10, 100, 'discount', 50)
+
+    fired = rules.evaluate([change('620:kr', record(1100000), record(550000, 50))])
+    assert sorted(rule[4] for rule, _ in fired) == [10, 50]
+
+    fired = rules.evaluate([change('620:kr', record(990000, 10), record(550000, 50))])
+    assert [rule[4] for rule, _ in fired] == [50]
+
+    fired = rules.evaluate([change('620:kr', record(550000, 50), record(275000, 75))])
+    assert fired == []
+
+
+def test_alert_lowest_tracks_all_time_low():
+    rules = steam.AlertRules()
+    rules.add(1, '620:kr', 10, 100, 'lowest', None)
+
+    assert len(rules.evaluate([change('620:kr', record(1100000), record(550000, 50))])) == 1
+    assert rules.evaluate([change('620:kr', record(1100000), record(550000, 50))]) == []
+    assert rules.evaluate([change('620:kr', record(550000, 50), record(1100000))]) == []
+    assert len(rules.evaluate([change('620:kr', record(1100000), record(275000, 75))])) == 1
+
+
+def test_alert_remove_cleans_up():
+    rules = steam.AlertRules()
+    rules.add(1, '620:kr', 10, 100, 'below', 2000000)
+    rules.add(2, '620:kr', 11, 100, 'below', 2000000)
+    rules.add(3, '620:kr', 10, 100, 'lowest', None)
+
+    assert sorted(rules.drop('620:kr', 10)) == [1, 3]
+    fired = rules.evaluate([change('620:kr', record(2500000), record(1500000))])
+    assert [rule[1] for rule, _ in fired] == [11]
+
+    rules.remove(2)
+    assert rules.rules == {}
+    assert rules.by_key == {}
+    assert rules.thresholds == {'below': {}, 'discount': {}}
+    assert rules.lowest == {}
+    assert rules.lowest_price == {}
+
+
+@pytest.fixture
+def breaker(monkeypatch):
+    clock = [1000.0]
+    monkeypatch.setattr(steam.time, 'monotonic', lambda: clock[0])
+    monkeypatch.setattr(steam, 'BREAKER_WINDOW', 60)
+    monkeypatch.setattr(steam, 'BREAKER_MIN_REQUESTS', 10)
+    monkeypatch.setattr(steam, 'BREAKER_THRESHOLD', 0.5)
+    monkeypatch.setattr(steam, 'BREAKER_COOLDOWN', 30)
+    monkeypatch.setattr(steam, 'BREAKER_MAX_COOLDOWN', 100)
+
+    breaker = steam.CircuitBreaker()
+    breaker.clock = clock
+    return breaker
+
+
+def test_breaker_needs_min_requests(breaker):
+    for _ in range(9):
+        breaker.record(False)
+
+    assert breaker.allow()
+    breaker.record(False)
+    assert not breaker.allow()
+    assert breaker.trips == 1
+
+
+def test_breaker_stays_closed_below_threshold(breaker):
+    for i in range(40):
+        breaker.record(i % 3 == 0 or i % 3 == 1)
+
+    assert breaker.allow()
+    assert breaker.trips == 0
+
+
+def test_breaker_forgets_old_outcomes(breaker):
+    for _ in range(9):
+        breaker.record(False)
+
+    breaker.clock[0] += 61
+    breaker.record(False)
+
+    assert breaker.allow()
+    assert breaker.failures == 1
+
+
+def test_breaker_ignores_unknown_outcomes(breaker):
+    for _ in range(20):
+        breaker.record(None)
+
+    assert breaker.allow()
+    assert not breaker.outcomes
+
+
+def test_breaker_half_open_probe(breaker):
+    for _ in range(10):
+        breaker.record(False)
+
+    breaker.clock[0] += 30
+    assert breaker.allow()
+    assert not breaker.allow()  # 확인 요청의 결과가 나올 때까지 다른 요청은 막음
+
+    breaker.record(False)  # 확인 요청이 실패하면 두 배로 기다림
+    assert breaker.trips == 2
+    breaker.clock[0] += 30
+    assert not breaker.allow()
+    breaker.clock[0] += 30
+    assert breaker.allow()
+
+    breaker.record(True)
+    assert breaker.allow()
+    assert breaker.allow()
+    assert breaker.cooldown == 30
+
+
+def test_breaker_ignores_requests_sent_before_opening(breaker):
+    generation = breaker.trips
+
+    for _ in range(10):
+        breaker.record(False, generation)
+
+    for _ in range(20):  # 브레이커가 열리기 전에 보낸 요청이 뒤늦게 실패해도 다시 열지 않음
+        breaker.record(False, generation)
+
+    assert breaker.trips == 1
+    assert breaker.cooldown == 60
+
+    breaker.clock[0] += 30
+    assert breaker.allow()
+    probe = breaker.trips
+
+    breaker.record(True, generation)  # 뒤늦게 성공한 요청도 브레이커를 닫지 않음
+    assert not breaker.allow()
+
+    breaker.record(True, probe)
+    assert breaker.allow()
+    assert breaker.cooldown == 30
+
+
+def test_breaker_cooldown_is_capped(breaker):
+    for _ in range(10):
+        breaker.record(False)
+
+    for _ in range(5):
+        breaker.clock[0] += breaker.opened_until - breaker.clock[0]
+        assert breaker.allow()
+        breaker.record(False)
+
+    assert breaker.opened_until - breaker.clock[0] == 100
+
+
+@pytest.fixture
+def fetcher(monkeypatch):
+    monkeypatch.setattr(steam, 'SPECIALS_FEED', True)
+    monkeypatch.setattr(steam, 'CYCLE_BUDGET', 0)
+
+    fetcher = steam.PriceFetcher()
+    fetcher.watch('620:kr', 'app', record(2200000), 0)
+    fetcher.fetched = []
+
+    async def fetch_items(ids):
+        fetcher.fetched += ids
+
+    fetcher.fetch_items = fetch_items
+    yield fetcher
+    fetcher.parse_executor.shutdown()
+
+
+def test_specials_cover_only_products_in_latest_sweep(fetcher):
+    feeds = [[('app', '620', 'Portal 2', (2200000, '₩ 22,000', 1100000, '₩ 11,000', True, 50))], []]
+
+    async def fetch_specials(cc):
+        return feeds.pop(0)
+
+    fetcher.fetch_specials = fetch_specials
+    loop = asyncio.new_event_loop()
+
+    # 할인 목록에 있던 제품은 다음 차례에 따로 불러오지 않음
+    loop.run_until_complete(fetcher.ingest_specials())
+    assert fetcher.item_dict['620:kr'].final == 1100000
+    assert '620:kr' in fetcher.specials_covered
+
+    # 다음 목록에서 빠지면 할인이 끝났을 수 있으므로 차례가 오면 직접 불러옴
+    fetcher.specials_at = 0
+    loop.run_until_complete(fetcher.run_cycle(['620:kr']))
+    assert fetcher.fetched == ['620:kr']
+    loop.close()
+
+
+def test_same_batch_body_after_specials_is_parsed(fetcher):
+    fetcher.watch('400:kr', 'app', record(1100000), 0)
+    fetcher.scheduler = steam.FetchScheduler(None)
+    price = {'initial': 2200000, 'final': 2200000, 'initial_formatted': '', 'final_formatted': '₩ 22,000', 'discount_percent': 0}
+    body = json.dumps({app_id: {'success': True, 'data': {'price_overview': price}} for app_id in ('400', '620')}).encode()
+    requests = []
+
+    async def get(url, **kwargs):
+        requests.append(url)
+        return steam.FetchResult(200, {}, url, (), body)
+
+    fetcher.scheduler.get = get
+    loop = asyncio.new_event_loop()
+
+    loop.run_until_complete(fetcher.fetch_app_prices(['400:kr', '620:kr'], 'kr'))
+    assert fetcher.item_dict['400:kr'].final == 2200000
+    assert [change.app_id for change in fetcher.price_changes] == ['400:kr']
+
+    # 같은 응답이면 파싱하지 않아도 가격이 그대로임
+    fetcher.price_changes.clear()
+    loop.run_until_complete(fetcher.fetch_app_prices(['400:kr', '620:kr'], 'kr'))
+    assert fetcher.price_changes == []
+
+    # 할인 목록으로 바뀐 가격은 이 응답에서 나온 것이 아니므로 같은 응답이 와도 다시 파싱해서 할인 종료를 알아챔
+    fetcher.store_price('620:kr', 'Portal 2', 2200000, '₩ 22,000', 1100000, '₩ 11,000', True, 50)
+    fetcher.price_changes.clear()
+    loop.run_until_complete(fetcher.fetch_app_prices(['400:kr', '620:kr'], 'kr'))
+    assert fetcher.item_dict['620:kr'].final == 2200000
+    assert [change.app_id for change in fetcher.price_changes] == ['620:kr']
+    assert len(requests) == 3
+    loop.close()
+
+
+def notification(key, user_ids, reasons=()):
+    return set(user_ids), change(key, record(2200000), record(1100000, 50)), f'https://store.steampowered.com/app/{key}', list(reasons)
+
+
+def test_render_changes_merges_small_batches():
+    messages = steam.render_changes([notification('620:kr', [10, 11]), notification('400:kr', [11, 12])])
+
+    assert len(messages) == 1
+    assert messages[0][0] == '<@10> <@11> <@12>'
+    assert len(messages[0][1].fields) == 2
+
+
+def test_render_changes_splits_long_mentions():
+    users = range(10 ** 17, 10 ** 17 + 200)
+    messages = steam.render_changes([notification('620:kr', users), notification('400:kr', [1])])
+
+    # 구독자가 많은 제품은 멘션을 이어지는 메시지로 나누고, 다음 제품은 따로 보냄
+    assert [embed is not None for _, embed in messages] == [True, False, False, True]
+    assert all(len(content) <= steam.CONTENT_LIMIT for content, _ in messages)
+    assert sum(content.count('<@') for content, _ in messages) == 201
+    assert messages[-1][0] == '<@1>'
+
+
+def test_render_changes_splits_large_embeds():
+    reasons = [f'<@{user_id}> 알림 조건 도달: ' + 'x' * 200 for user_id in range(5)]
+    messages = steam.render_changes([notification(f'{i}:kr', [i], reasons) for i in range(10)])
+
+    assert len(messages) > 1
+    assert all(len(embed) <= steam.EMBED_LIMIT for _, embed in messages)
+    assert sum(len(embed.fields) or 1 for _, embed in messages) == 10
+
+
+@pytest.fixture
+def catalog():
+    names = {620: 'Portal 2', 400: 'Portal', 220: 'Half-Life 2', 70: 'Half-Life', 440: 'Team Fortress 2'}
+    catalog = steam.Catalog()
+    catalog.replace(names, steam.build_catalog_index(names))
+    return catalog
+
+
+def test_catalog_prefix_search(catalog):
+    assert catalog.search('po') == [('400', 'Portal'), ('620', 'Portal 2')]
+    assert catalog.search('  ') == []
+
+
+def test_catalog_trigram_search(catalog):
+    assert catalog.search('half life 2')[0] == ('220', 'Half-Life 2')
+    assert catalog.search('HALF-LIFE')[:2] == [('70', 'Half-Life'), ('220', 'Half-Life 2')]
+    assert catalog.search('fortress') == [('440', 'Team Fortress 2')]
+    assert catalog.search('xyzzy') == []
+
+
+def test_catalog_local_names(catalog):
+    catalog.add_local_name(620, '포탈 2')
+
+    assert catalog.search('포탈') == [('620', '포탈 2')]
+    assert catalog.search('portal 2')[0] == ('620', '포탈 2')
+
+
+def test_catalog_update_drops_removed_and_clears_cache(catalog):
+    assert catalog.search('portal') == [('400', 'Portal'), ('620', 'Portal 2')]
+
+    catalog.update({1400: 'Portal Stories: Mel'}, [400])
+
+    results = catalog.search('portal')
+    assert ('400', 'Portal') not in results
+    assert ('1400', 'Portal Stories: Mel') in results
+
+
+def test_parse_recorded_store_responses():
+    price = json.loads(fixture('appdetails.json'))['620']['data']['price_overview']
+    assert steam.parse_app_price(price) == (1100000, '', 1100000, '₩ 11,000', False, 0)
+
+    price = json.loads(fixture('packagedetails.json'))['7877']['data']['price']
+    assert steam.parse_package_price(price) == (1100000, '₩ 11,000', 1100000, '₩ 11,000', False, 0)
+
+    bundle = json.loads(fixture('ajaxresolvebundles.json'))[0]
+    assert steam.parse_bundle_json(bundle) == (15000000, '₩ 150,000', 13500000, '₩ 135,000', True, 10)
+    assert steam.parse_bundle_page(fixture('bundle.html')) == ('Valve Complete Pack',) + steam.parse_bundle_json(bundle)
+
+
+def test_parse_recorded_search_page():
+    results = steam.parse_search_page(fixture('search.html'))
+
+    assert [name for name, _, _ in results] == ['Portal 2', 'Portal', 'Portal Bundle', 'Valve Complete Pack']
+    assert results[0][1].startswith('https://store.steampowered.com/app/620/')
+    assert [price for _, _, price in results] == ['₩ 11,000', '₩ 10,500', '₩ 18,000', '₩ 135,000']
+
+
+def test_storage_imports_added_products_json(tmp_path):
+    path = tmp_path / 'added_products.json'
+    path.write_text(json.dumps({'620': {'user_id': 10, 'guild': 1, 'channel': 100, 'type': 'app'},
+                                '7877': {'user_id': 11, 'guild': 1, 'channel': 101, 'type': 'sub'}}))
+
+    storage = steam.Storage(str(tmp_path / 'steam.db'))
+    storage.migrate_json(str(path))
+    storage.migrate_regions('kr')
+
+    assert not path.exists()
+    assert (tmp_path / 'added_products.json.migrated').exists()
+    assert storage.db.execute('SELECT * FROM products ORDER BY rowid').fetchall() == [('620:kr', 'app'), ('7877:kr', 'sub')]
+    assert storage.products_by_user(10, 1) == ['620:kr']
+    assert storage.products_by_channel(101) == ['7877:kr']
+    assert storage.db.execute('PRAGMA foreign_key_check').fetchall() == []
+
+    # 이미 제품이 있으면 다시 가져오지 않음
+    path.write_text(json.dumps({'400': {'user_id': 10, 'guild': 1, 'channel': 100, 'type': 'app'}}))
+    storage.migrate_json(str(path))
+    storage.migrate_regions('kr')
+
+    assert storage.db.execute('SELECT product_id FROM products ORDER BY rowid').fetchall() == [('620:kr',), ('7877:kr',)]
+    assert path.exists()
+    storage.close()
+
+
+def test_storage_new_database(tmp_path):
+    storage = steam.Storage(str(tmp_path / 'new.db'))
+    storage.migrate_json(str(tmp_path / 'added_products.json'))
+    storage.migrate_regions('kr')
+
+    assert 'region' in [row[1] for row in storage.db.execute('PRAGMA table_info(price_history)')]
+    assert dict((row[1], row[2]) for row in storage.db.execute('PRAGMA table_info(prices)'))['final'] == 'INTEGER'
+    assert storage.load_watchlist() == ({}, {})
+    storage.close()